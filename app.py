@@ -1,15 +1,36 @@
 from dotenv import load_dotenv
 import os
+import base64
 import json
 import difflib
+import re
 import hmac
-import subprocess
+import queue
 import sys
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from flask import Flask, request, render_template, redirect, url_for, jsonify
-from sqlalchemy import create_engine, text
+from itertools import groupby
+from pathlib import Path
+from flask import (
+    Flask, g, has_request_context, request, render_template, redirect, url_for,
+    jsonify,
+)
+from markupsafe import Markup, escape
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.exc import SQLAlchemyError
 
+from scripts.backup_db import run_backup
+from scripts.sqlite_profiles import apply_pragmas, effective_pragmas, profile_pragmas
+from scripts.units import aggregate as aggregate_quantities, canonical_amount, split_amount
+from scripts.version_diff import DIFF_ENGINE, diff_versions
+from scripts.version_store import (
+    COMPRESSED_FIELDS, KEYFRAME_INTERVAL, SNAPSHOT_FIELDS, ZDICT_MIN_BYTES,
+    ZDICT_MIN_ROWS, ZDICT_RETRAIN_GROWTH, compress_columns, current_zdict_id,
+    decompress, materialize, storage_columns, train_zdict, zdict_due,
+)
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -17,27 +38,189 @@ app = Flask(__name__)
 
 # Database configuration — plain SQLite.
 # Local dev: defaults to sqlite:///recipe.db.
-# VPS: DATABASE_URL is set via docker-compose to sqlite:///recipe.db
-#      and bind-mounted from /opt/recipe-db/data/recipe.db on the host.
+# VPS: DATABASE_URL is set via docker-compose to sqlite:////app/data/recipe.db;
+#      /opt/recipe-db/data is bind-mounted as a directory so WAL's -wal/-shm
+#      side files live next to the DB on the host.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///recipe.db")
-engine = create_engine(DATABASE_URL, future=True, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, future=True)
+
+# Connection tuning — see scripts/sqlite_profiles.py. SQLITE_PROFILE=prod
+# (set in docker-compose) gives WAL + busy_timeout + FKs + mmap.
+#
+# pysqlite's own transaction handling issues a deferred BEGIN lazily, so a
+# read-then-write transaction can fail with SQLITE_BUSY when it tries to
+# upgrade its lock — busy_timeout can't help there. We take over BEGIN
+# instead: reads use a plain BEGIN, and write paths go through
+# `write_engine`, whose transactions start with BEGIN IMMEDIATE and so
+# wait (busy_timeout) for the write lock up front.
+SQLITE_PROFILE, SQLITE_PRAGMAS = profile_pragmas()
+
+if engine.dialect.name == 'sqlite':
+    @event.listens_for(engine, 'connect')
+    def _sqlite_on_connect(dbapi_conn, _record):
+        dbapi_conn.isolation_level = None
+        apply_pragmas(dbapi_conn, SQLITE_PRAGMAS)
+
+    @event.listens_for(engine, 'begin')
+    def _sqlite_on_begin(conn):
+        mode = conn.get_execution_options().get('sqlite_begin', 'DEFERRED')
+        conn.exec_driver_sql(f"BEGIN {mode}")
+
+    with engine.connect() as _conn:
+        _effective = effective_pragmas(_conn.connection.dbapi_connection,
+                                       SQLITE_PRAGMAS)
+    print(
+        f"sqlite profile={SQLITE_PROFILE} "
+        + " ".join(f"{k}={v}" for k, v in _effective.items()),
+        file=sys.stderr,
+    )
+
+write_engine = engine.execution_options(sqlite_begin='IMMEDIATE')
+
+
+# Pre-edit backups. Snapshots go through the same helpers as the daily cron
+# (scripts/backup_db.py, SQLite online backup API) but run on a background
+# thread inside the app process, so an edit only pays for a queue put.
+# BACKUP_STORE=pages selects the deduplicating page store.
+BACKUP_COALESCE_SECONDS = float(os.getenv("BACKUP_COALESCE_SECONDS", "60"))
+BACKUP_STORE = os.getenv("BACKUP_STORE") or "files"
+
+
+class BackupService:
+    """Background pre-edit snapshotter.
+
+    request() enqueues and returns immediately. The worker takes at most one
+    snapshot per `window` seconds: requests that arrive while a snapshot is
+    recent (or queued behind one) are coalesced. A coalesced request marks
+    the service dirty, and one trailing snapshot is taken when the window
+    closes, so the last edit of a burst is captured without waiting for a
+    later, unrelated edit. Because the edit doesn't wait, a snapshot can
+    include the edit that triggered it — recipe_version remains the exact
+    per-row pre-edit history; these files are defense-in-depth for whole-DB
+    mistakes.
+
+    Each gunicorn worker runs its own service, so the effective rate is one
+    snapshot per window per worker."""
+
+    def __init__(self, db_path, backup_dir, window=BACKUP_COALESCE_SECONDS,
+                 store=BACKUP_STORE):
+        self.db_path = db_path
+        self.backup_dir = Path(backup_dir)
+        self.window = window
+        self.store = store
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_snapshot_at = None  # time.monotonic()
+        self._last_snapshot = None
+        self._last_error = None
+        self._taken = 0
+        self._coalesced = 0
+        self._dirty = False  # coalesced requests not yet in any snapshot
+        self._dirty_note = None
+
+    def request(self, note=None):
+        with self._lock:
+            # Started lazily so gunicorn's fork never inherits a live thread.
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="backup-service", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(note)
+
+    def status(self):
+        with self._lock:
+            last_at = self._last_snapshot_at
+            return {
+                'queue_depth': self._queue.qsize(),
+                'last_snapshot': self._last_snapshot,
+                'last_snapshot_age_seconds': (
+                    round(time.monotonic() - last_at, 1) if last_at is not None else None
+                ),
+                'snapshots_taken': self._taken,
+                'requests_coalesced': self._coalesced,
+                'trailing_snapshot_pending': self._dirty,
+                'coalesce_window_seconds': self.window,
+                'store': self.store,
+                'last_error': self._last_error,
+            }
+
+    def _window_left(self):
+        """Seconds until the coalescing window closes, or None to wait for
+        the next request indefinitely (nothing coalesced is waiting)."""
+        with self._lock:
+            if not self._dirty:
+                return None
+            return max(0.0, self.window - (time.monotonic() - self._last_snapshot_at))
+
+    def _run(self):
+        while True:
+            try:
+                note = self._queue.get(timeout=self._window_left())
+            except queue.Empty:
+                # Window closed with coalesced requests: one trailing snapshot.
+                with self._lock:
+                    note, self._dirty, self._dirty_note = self._dirty_note, False, None
+                self._snapshot(note)
+                continue
+            burst = 1
+            while True:  # drain whatever queued up behind this request
+                try:
+                    note = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                burst += 1
+            with self._lock:
+                recent = (self._last_snapshot_at is not None and
+                          time.monotonic() - self._last_snapshot_at < self.window)
+                self._coalesced += burst if recent else burst - 1
+                if recent:
+                    self._dirty, self._dirty_note = True, note
+                else:
+                    self._dirty, self._dirty_note = False, None
+            if not recent:
+                self._snapshot(note)
+
+    def _snapshot(self, note):
+        try:
+            out, _ = run_backup(self.db_path, self.backup_dir, "pre-edit",
+                                note, self.store)
+        except Exception as e:  # noqa: BLE001 — never let backup failure break edits
+            print(f"backup_before_edit failed: {e}", file=sys.stderr)
+            with self._lock:
+                self._last_error = str(e)
+            return
+        with self._lock:
+            self._last_snapshot_at = time.monotonic()
+            self._last_snapshot = out.name
+            self._last_error = None
+            self._taken += 1
+
+
+_backup_service = None
+
+
+def _get_backup_service():
+    """The process-wide BackupService, or None when BACKUP_DIR is unset."""
+    global _backup_service
+    backup_dir = os.environ.get("BACKUP_DIR")
+    if not backup_dir:
+        return None
+    if _backup_service is None:
+        db_path = os.environ.get("RECIPE_DB_PATH") or engine.url.database
+        _backup_service = BackupService(db_path, backup_dir)
+    return _backup_service
 
 
 def _backup_before_edit(note: str | None = None) -> None:
-    """Take a pre-edit SQLite snapshot if BACKUP_DIR is configured.
-    No-op on local dev (BACKUP_DIR unset). Failures are logged but never
-    block the edit — backups are defense-in-depth, recipe_version is the
-    authoritative per-row history."""
-    if not os.environ.get("BACKUP_DIR"):
-        return
-    script = os.path.join(os.path.dirname(__file__), "scripts", "backup_db.py")
-    cmd = [sys.executable, script, "pre-edit"]
-    if note:
-        cmd.append(f"--note={note}")
-    try:
-        subprocess.run(cmd, check=True, timeout=30, capture_output=True)
-    except Exception as e:  # noqa: BLE001 — never let backup failure break edits
-        print(f"backup_before_edit failed: {e}", file=sys.stderr)
+    """Queue a pre-edit SQLite snapshot if BACKUP_DIR is configured.
+    No-op on local dev (BACKUP_DIR unset). Never blocks or fails the edit —
+    backups are defense-in-depth, recipe_version is the authoritative
+    per-row history."""
+    service = _get_backup_service()
+    if service is not None:
+        service.request(note)
 
 
 # ---------------------------------------------------------------------------
@@ -78,9 +261,40 @@ ALLOWED_GROCERY_CATEGORIES = {
 }
 
 
+def _alias_keys(aliases):
+    """Normalised ingredient_alias keys for an aliases list (or its JSON
+    string). Python lower() rather than SQLite NOCASE, which only folds ASCII
+    and would miss å/ä/ö."""
+    if isinstance(aliases, str) or aliases is None:
+        try:
+            aliases = json.loads(aliases or '[]')
+        except (TypeError, ValueError):
+            return set()
+    if not isinstance(aliases, list):
+        return set()
+    return {a.strip().lower() for a in aliases if isinstance(a, str) and a.strip()}
+
+
+def _sync_ingredient_aliases(conn, ingredient_id, aliases):
+    """Rewrite the ingredient_alias index rows for one ingredient. Must be
+    called whenever ingredient.aliases is written (migration 007)."""
+    conn.execute(
+        text("DELETE FROM ingredient_alias WHERE ingredient_id = :id"),
+        {'id': ingredient_id},
+    )
+    keys = _alias_keys(aliases)
+    if keys:
+        conn.execute(
+            text("INSERT INTO ingredient_alias (alias_key, ingredient_id) "
+                 "VALUES (:key, :id)"),
+            [{'key': k, 'id': ingredient_id} for k in sorted(keys)],
+        )
+
+
 def _resolve_ingredient_id(conn, name):
     """Return canonical ingredient id for `name`, matching by name (NOCASE)
-    or by aliases JSON-array. Returns None if no match in the catalog."""
+    or by alias via the ingredient_alias index. Returns None if no match in
+    the catalog."""
     name = (name or '').strip()
     if not name:
         return None
@@ -90,58 +304,470 @@ def _resolve_ingredient_id(conn, name):
     ).scalar()
     if row_id:
         return row_id
-    # Alias lookup. aliases is a JSON array of strings stored per ingredient.
-    rows = conn.execute(text("SELECT id, aliases FROM ingredient")).mappings().all()
-    target = name.lower()
-    for r in rows:
-        try:
-            aliases = json.loads(r['aliases'] or '[]')
-        except (TypeError, ValueError):
-            continue
-        if any(target == (a or '').strip().lower() for a in aliases):
-            return r['id']
-    return None
+    # Alias lookup — one probe on the (alias_key, ingredient_id) primary key.
+    # Lowest id wins if an alias is shared, same as the old rowid-order scan.
+    return conn.execute(
+        text("SELECT ingredient_id FROM ingredient_alias "
+             "WHERE alias_key = :key ORDER BY ingredient_id LIMIT 1"),
+        {'key': name.lower()},
+    ).scalar()
 
 
-def _resolve_or_create_ingredient(conn, name, grocery_category=None,
-                                  default_unit=None, kitchen_staple=0):
-    """Strict resolver: matches the canonical catalog by name or alias.
-    Only creates a new row if BOTH grocery_category (valid) and default_unit
-    are supplied — otherwise raises IngredientNotInCatalog so the caller can
-    surface a helpful error rather than silently fabricating a NULL-category
-    entry."""
-    name = (name or '').strip()
-    if not name:
-        return None
-    existing = _resolve_ingredient_id(conn, name)
-    if existing:
-        return existing
-
-    missing = []
-    if not grocery_category or grocery_category not in ALLOWED_GROCERY_CATEGORIES:
-        missing.append('grocery_category')
-    if not default_unit or not str(default_unit).strip():
-        missing.append('default_unit')
-    if missing:
-        raise IngredientNotInCatalog(name, missing)
+# SQLite's NOCASE collation folds ASCII A-Z only; mirror it when matching
+# batch query results back to the requested names.
+_NOCASE_FOLD = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                             'abcdefghijklmnopqrstuvwxyz')
+
+
+def _nocase(s):
+    return s.translate(_NOCASE_FOLD)
+
+
+def _resolve_ingredient_ids(conn, names):
+    """Batch form of _resolve_ingredient_id: one query for the whole list.
+    Returns {stripped name: id or None}. Name matches beat alias matches,
+    exactly as in the single-name resolver."""
+    wanted = sorted({(n or '').strip() for n in names} - {''})
+    if not wanted:
+        return {}
+    params = {}
+    for i, n in enumerate(wanted):
+        params[f'n{i}'] = n
+        params[f'k{i}'] = n.lower()
+    name_ph = ','.join(f':n{i}' for i in range(len(wanted)))
+    key_ph = ','.join(f':k{i}' for i in range(len(wanted)))
+    rows = conn.execute(text(f'''
+        SELECT 0 AS via_alias, name AS k, id FROM ingredient
+        WHERE name IN ({name_ph})
+        UNION ALL
+        SELECT 1, alias_key, MIN(ingredient_id) FROM ingredient_alias
+        WHERE alias_key IN ({key_ph})
+        GROUP BY alias_key
+    '''), params).all()
+    by_name = {_nocase(k): i for via_alias, k, i in rows if not via_alias}
+    by_alias = {k: i for via_alias, k, i in rows if via_alias}
+    return {
+        n: by_name.get(_nocase(n)) or by_alias.get(n.lower())
+        for n in wanted
+    }
 
-    conn.execute(
-        text(
-            "INSERT INTO ingredient (name, grocery_category, default_unit, "
-            "                        kitchen_staple, aliases) "
-            "VALUES (:name, :gc, :du, :ks, '[]')"
-        ),
-        {
+
+def _resolve_or_create_ingredients(conn, ingredients):
+    """Strict batch resolver: matches the canonical catalog by name or alias
+    in one query and returns a list of ids aligned with `ingredients` (None
+    for blank names). Unknown names are only created if BOTH grocery_category
+    (valid) and default_unit are supplied — all of them in one INSERT.
+    Otherwise raises IngredientNotInCatalog for the first offending name,
+    before anything is written, so the caller can surface a helpful error
+    rather than silently fabricating a NULL-category entry."""
+    names = [(ing.get('name') or '').strip() for ing in ingredients]
+    resolved = _resolve_ingredient_ids(conn, names)
+
+    to_create = {}  # NOCASE key → insert params, first occurrence wins
+    for ing, name in zip(ingredients, names):
+        if not name or resolved.get(name) or _nocase(name) in to_create:
+            continue
+        grocery_category = ing.get('grocery_category')
+        default_unit = ing.get('default_unit')
+        missing = []
+        if not grocery_category or grocery_category not in ALLOWED_GROCERY_CATEGORIES:
+            missing.append('grocery_category')
+        if not default_unit or not str(default_unit).strip():
+            missing.append('default_unit')
+        if missing:
+            raise IngredientNotInCatalog(name, missing)
+        to_create[_nocase(name)] = {
             'name': name,
             'gc': grocery_category,
             'du': str(default_unit).strip(),
-            'ks': 1 if kitchen_staple else 0,
-        },
+            'ks': 1 if ing.get('kitchen_staple', 0) else 0,
+        }
+
+    if to_create:
+        params = {}
+        values = []
+        for i, row in enumerate(to_create.values()):
+            values.append(f"(:name{i}, :gc{i}, :du{i}, :ks{i}, '[]')")
+            params.update({f'{k}{i}': v for k, v in row.items()})
+        conn.execute(text(
+            "INSERT INTO ingredient (name, grocery_category, default_unit, "
+            "                        kitchen_staple, aliases) "
+            "VALUES " + ', '.join(values)
+        ), params)
+        created = _resolve_ingredient_ids(
+            conn, [row['name'] for row in to_create.values()]
+        )
+        for name in names:
+            if name and not resolved.get(name):
+                resolved[name] = created[to_create[_nocase(name)]['name']]
+
+    return [resolved.get(name) if name else None for name in names]
+
+
+def _link_row(ing, ing_id):
+    """recipe_ingredient column values for one requested ingredient,
+    including the parsed amount_min/amount_max/unit_canonical (migration
+    012) stored next to the original text."""
+    amount = str(ing.get('amount', '') or '')
+    unit = ing.get('unit', '') or ''
+    amount_min, amount_max, unit_canonical = canonical_amount(amount, unit)
+    return {
+        'ingredient_id': ing_id,
+        'amount': amount,
+        'unit': unit,
+        'note': ing.get('note', '') or '',
+        'amount_min': amount_min,
+        'amount_max': amount_max,
+        'unit_canonical': unit_canonical,
+    }
+
+
+_INSERT_LINK_SQL = '''
+    INSERT INTO recipe_ingredient
+        (recipe_id, ingredient_id, amount, unit, note,
+         amount_min, amount_max, unit_canonical)
+    VALUES (:recipe_id, :ingredient_id, :amount, :unit, :note,
+            :amount_min, :amount_max, :unit_canonical)
+'''
+
+
+def _insert_recipe_ingredients(conn, recipe_id, ingredients):
+    """Resolve `ingredients` in batch and link them to `recipe_id` with one
+    executemany. Blank names are skipped."""
+    ids = _resolve_or_create_ingredients(conn, ingredients)
+    rows = [
+        {**_link_row(ing, ing_id), 'recipe_id': recipe_id}
+        for ing, ing_id in zip(ingredients, ids) if ing_id
+    ]
+    if rows:
+        conn.execute(text(_INSERT_LINK_SQL), rows)
+
+
+# recipe_ingredient.amount has REAL affinity: numeric-looking text is stored
+# (and read back) as a float, anything else stays text.
+_NUMERIC_TEXT = re.compile(r'^\s*[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?\s*$')
+
+
+def _link_key(ingredient_id, amount, unit, note):
+    """Comparable form of a recipe_ingredient row as SQLite would store it.
+    NULL and '' are treated alike — both render as empty."""
+    if isinstance(amount, str) and _NUMERIC_TEXT.match(amount):
+        amount = float(amount)
+    return (ingredient_id, amount if amount is not None else '',
+            unit or '', note or '')
+
+
+def _replace_recipe_ingredients(conn, recipe_id, cur_links, ingredients):
+    """Make recipe_id's links equal `ingredients` with as few writes as
+    possible. `cur_links` are the current rows (link_id, ingredient_id,
+    amount, unit, note) in rowid order — the order every read path shows.
+
+    Rows are aligned with difflib.SequenceMatcher: unchanged rows are left
+    alone, changed rows are UPDATEd in place and surplus rows are DELETEd.
+    New rows can only be appended at the end of the rowid order, so after
+    the first insert that isn't at the tail the remaining rows are rewritten
+    positionally instead. Nothing is written if nothing changed. Returns
+    (updated, inserted, deleted) counts."""
+    ids = _resolve_or_create_ingredients(conn, ingredients)
+    new_rows = [
+        _link_row(ing, ing_id)
+        for ing, ing_id in zip(ingredients, ids) if ing_id
+    ]
+    cur_keys = [_link_key(r['ingredient_id'], r['amount'], r['unit'], r['note'])
+                for r in cur_links]
+    new_keys = [_link_key(r['ingredient_id'], r['amount'], r['unit'], r['note'])
+                for r in new_rows]
+    if cur_keys == new_keys:
+        return 0, 0, 0
+
+    updates, inserts, deletes = [], [], []
+
+    def pair(cur_idx, new_idx):
+        """UPDATE cur_idx[k] → new_idx[k] where they differ, DELETE surplus
+        current rows, and return the surplus new indexes."""
+        for c, n in zip(cur_idx, new_idx):
+            if cur_keys[c] != new_keys[n]:
+                updates.append({**new_rows[n], 'link_id': cur_links[c]['link_id']})
+        k = min(len(cur_idx), len(new_idx))
+        deletes.extend({'link_id': cur_links[c]['link_id']} for c in cur_idx[k:])
+        return new_idx[k:]
+
+    matcher = difflib.SequenceMatcher(None, cur_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if j2 - j1 > i2 - i1 and i2 < len(cur_links):
+            # Mid-list insert: rewrite everything from here positionally so
+            # the rowid order matches the requested order.
+            extra = pair(range(i1, len(cur_links)), range(j1, len(new_rows)))
+            inserts.extend(new_rows[n] for n in extra)
+            break
+        extra = pair(range(i1, i2), range(j1, j2))
+        inserts.extend(new_rows[n] for n in extra)
+
+    if deletes:
+        conn.execute(text("DELETE FROM recipe_ingredient WHERE id=:link_id"), deletes)
+    if updates:
+        conn.execute(text('''
+            UPDATE recipe_ingredient
+            SET ingredient_id=:ingredient_id, amount=:amount, unit=:unit, note=:note,
+                amount_min=:amount_min, amount_max=:amount_max,
+                unit_canonical=:unit_canonical
+            WHERE id=:link_id
+        '''), updates)
+    if inserts:
+        conn.execute(text(_INSERT_LINK_SQL),
+                     [{**r, 'recipe_id': recipe_id} for r in inserts])
+    return len(updates), len(inserts), len(deletes)
+
+
+# recipe_fts.ingredients (migration 008) isn't maintained by triggers on
+# recipe_ingredient; writers refresh it once per recipe after changing links.
+_REFRESH_FTS_INGREDIENTS_SQL = '''
+    UPDATE recipe_fts SET ingredients = (
+        SELECT coalesce(group_concat(name, ', '), '') FROM (
+            SELECT i.name FROM recipe_ingredient ri
+            JOIN ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = :id
+            ORDER BY ri.id
+        )
     )
-    return conn.execute(
-        text("SELECT id FROM ingredient WHERE name = :name COLLATE NOCASE"),
-        {'name': name},
-    ).scalar()
+    WHERE rowid = :id
+'''
+
+
+def _refresh_recipe_fts(conn, recipe_id):
+    conn.execute(text(_REFRESH_FTS_INGREDIENTS_SQL), {'id': recipe_id})
+
+
+def _split_tags(raw):
+    """Tags in a recipe.tags string: trimmed, blanks dropped, first spelling
+    of each NOCASE-equal tag kept (recipe_tag.tag is COLLATE NOCASE)."""
+    out, seen = [], set()
+    for t in (raw or '').split(','):
+        t = t.strip()
+        if t and _nocase(t) not in seen:
+            seen.add(_nocase(t))
+            out.append(t)
+    return out
+
+
+def _sync_recipe_tags(conn, recipe_id, raw_tags):
+    """Rewrite recipe_tag (migration 010) for one recipe from its
+    comma-separated tags string. recipe.tags stays the source of truth."""
+    conn.execute(
+        text("DELETE FROM recipe_tag WHERE recipe_id = :id"), {'id': recipe_id}
+    )
+    rows = [{'id': recipe_id, 'tag': t} for t in _split_tags(raw_tags)]
+    if rows:
+        conn.execute(
+            text("INSERT INTO recipe_tag (recipe_id, tag) VALUES (:id, :tag)"),
+            rows,
+        )
+
+
+# recipe_version is delta-encoded (migration 013, scripts/version_store.py):
+# a keyframe every HISTORY_KEYFRAME_INTERVAL versions, per-field deltas in
+# between. 1 stores every version in full.
+HISTORY_KEYFRAME_INTERVAL = max(1, int(os.environ.get(
+    'HISTORY_KEYFRAME_INTERVAL', KEYFRAME_INTERVAL)))
+
+
+# Compression dictionaries (migration 014), {id: bytes}. Rows never change
+# once written, so the cache only reloads when a value names an id it
+# hasn't seen (a dictionary trained after this process started).
+_zdict_cache = None
+
+
+def _zdicts(conn, reload=False):
+    global _zdict_cache
+    if _zdict_cache is None or reload:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type='table' AND name='recipe_version_zdict'"
+        )).first()
+        _zdict_cache = dict(conn.execute(text(
+            "SELECT id, zdict FROM recipe_version_zdict"
+        )).all()) if exists else {}
+    return _zdict_cache
+
+
+# recipe_version id at which this worker next checks whether a new
+# dictionary is due; None until the first write.
+_zdict_check_at = None
+
+
+def _latest_trained_rows(conn):
+    """trained_rows of the newest usable dictionary, None if there is none."""
+    latest = conn.execute(text("""
+        SELECT COALESCE(trained_rows, 0) FROM recipe_version_zdict
+        WHERE length(zdict) >= :min_bytes ORDER BY id DESC LIMIT 1
+    """), {'min_bytes': ZDICT_MIN_BYTES}).first()
+    return latest[0] if latest else None
+
+
+def _maybe_train_zdict(version_row_id):
+    """Train a new compression dictionary once recipe_version has grown
+    past the threshold (version_store.zdict_due): ZDICT_MIN_ROWS rows for
+    the first, ZDICT_RETRAIN_GROWTH times the rows the newest was trained
+    on after that.
+
+    Called after a request that wrote versions has finished, never inside
+    an edit's transaction: a rolled-back edit can't take a dictionary with
+    it. Samples are read and the dictionary trained outside any write lock;
+    the INSERT gets its own short transaction, which re-checks that no
+    other worker trained one meanwhile. The dictionary cache is only
+    dropped once that transaction has committed.
+
+    Rows are never deleted (migration 017) and committed ids only grow, so
+    between checks the newest row's id stands in for COUNT(*)."""
+    global _zdict_check_at, _zdict_cache
+    if _zdict_check_at is not None and version_row_id < _zdict_check_at:
+        return
+    with engine.connect() as conn:
+        cols = {r[1] for r in conn.execute(text(
+            "PRAGMA table_info(recipe_version_zdict)"
+        ))}
+        if 'trained_rows' not in cols:
+            # Migration 014 hasn't run (or predates trained_rows): leave it to it.
+            _zdict_check_at = float('inf')
+            return
+        row_count, max_id = conn.execute(text(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM recipe_version"
+        )).one()
+        trained_rows = _latest_trained_rows(conn)
+        samples = None
+        if zdict_due(row_count, trained_rows):
+            zdicts = dict(conn.execute(text(
+                "SELECT id, zdict FROM recipe_version_zdict"
+            )).all())
+            samples = [
+                (r[0], decompress(value, zdicts))
+                for r in conn.execute(text(
+                    f"SELECT recipe_id, {', '.join(COMPRESSED_FIELDS)} FROM recipe_version"
+                ))
+                for value in r[1:] if value
+            ]
+    if samples is not None:
+        zdict = train_zdict(samples)
+        if len(zdict) >= ZDICT_MIN_BYTES:
+            with write_engine.begin() as conn:
+                if _latest_trained_rows(conn) == trained_rows:
+                    conn.execute(text("""
+                        INSERT INTO recipe_version_zdict
+                            (zdict, trained_at, samples, trained_rows)
+                        VALUES (:zdict, :at, :samples, :rows)
+                    """), {'zdict': zdict,
+                           'at': datetime.now(timezone.utc).isoformat(),
+                           'samples': len(samples), 'rows': row_count})
+            _zdict_cache = None  # committed: the next _zdicts() reloads
+            trained_rows = row_count
+    due_at = max(ZDICT_MIN_ROWS, ZDICT_RETRAIN_GROWTH * (trained_rows or 0))
+    # Counted from the committed rows, not version_row_id: a rolled-back
+    # edit's id is handed out again. Still due means the dictionary came
+    # out too short: retry later.
+    _zdict_check_at = max_id + (
+        due_at - row_count if due_at > row_count else ZDICT_MIN_ROWS
+    )
+
+
+@app.after_request
+def _train_zdict_after_versions(response):
+    """Runs once the route has returned, so its transactions have committed
+    or rolled back; _maybe_train_zdict only looks at committed rows."""
+    version_row_id = g.pop('version_row_id', None)
+    if version_row_id is not None:
+        try:
+            _maybe_train_zdict(version_row_id)
+        except Exception as e:  # noqa: BLE001 — never fail the edit's response
+            print(f"zdict training failed: {e}", file=sys.stderr)
+    return response
+
+
+def _materialize(conn, rows, wanted=None):
+    try:
+        return materialize(rows, wanted, _zdicts(conn))
+    except ValueError:
+        return materialize(rows, wanted, _zdicts(conn, reload=True))
+
+
+def _version_chain(conn, recipe_id, v_lo, v_hi):
+    """recipe_version rows of one recipe from the last keyframe at or before
+    v_lo up to v_hi, in version order — what materialize() needs."""
+    return conn.execute(text('''
+        SELECT * FROM recipe_version
+        WHERE recipe_id = :rid AND version_number <= :hi
+          AND version_number >= COALESCE((
+              SELECT MAX(version_number) FROM recipe_version
+              WHERE recipe_id = :rid AND version_number <= :lo
+                AND delta_json IS NULL
+          ), 0)
+        ORDER BY version_number
+    '''), {'rid': recipe_id, 'lo': v_lo, 'hi': v_hi}).mappings().all()
+
+
+def load_versions(conn, recipe_id, version_numbers):
+    """Full recipe_version rows, {version_number: dict}, for the requested
+    versions of one recipe; versions that don't exist are absent. Versions
+    close together share one chain read; far-apart ones are read from
+    their own keyframes."""
+    wanted = sorted(set(version_numbers))
+    out = {}
+    while wanted:
+        group = [v for v in wanted if v - wanted[0] <= HISTORY_KEYFRAME_INTERVAL]
+        wanted = wanted[len(group):]
+        rows = _version_chain(conn, recipe_id, group[0], group[-1])
+        out.update(_materialize(conn, rows, set(group)))
+    return out
+
+
+def _insert_version(conn, recipe_id, version_number, snapshot,
+                    changed_at, changed_by, change_note):
+    """Write one recipe_version row for snapshot (title, description, …,
+    ingredients_json) — as a keyframe or as a delta against the previous
+    version, per HISTORY_KEYFRAME_INTERVAL, compressed with the newest
+    usable dictionary once one has been trained — plus its diff against
+    the previous version."""
+    chain = _version_chain(conn, recipe_id, version_number - 1,
+                           version_number - 1)
+    prev = (_materialize(conn, chain)[chain[-1]['version_number']]
+            if chain else None)
+    zdicts = _zdicts(conn)
+    zdict_id = current_zdict_id(zdicts)
+    stored = compress_columns(
+        storage_columns(prev, snapshot, len(chain), HISTORY_KEYFRAME_INTERVAL),
+        zdict_id, zdicts.get(zdict_id),
+    )
+    version_row_id = conn.execute(text('''
+        INSERT INTO recipe_version
+            (recipe_id, version_number, title, description, instructions, notes,
+             tags, type, kitchen, ingredients_json, delta_json, changed_at,
+             changed_by, change_note)
+        VALUES (:recipe_id, :ver, :title, :description, :instructions, :notes,
+                :tags, :type, :kitchen, :ingredients_json, :delta_json,
+                :changed_at, :changed_by, :change_note)
+    '''), {
+        **snapshot, **stored,
+        'recipe_id': recipe_id, 'ver': version_number,
+        'changed_at': changed_at, 'changed_by': changed_by,
+        'change_note': change_note,
+    }).lastrowid
+    if has_request_context():
+        # Checked after the request, outside this transaction.
+        g.version_row_id = max(g.get('version_row_id', 0), version_row_id)
+    if prev is not None:
+        # recipe_version_diff (migration 015): the diff shown for this
+        # version in the history, computed once here instead of per view.
+        conn.execute(text('''
+            INSERT OR REPLACE INTO recipe_version_diff
+                (recipe_id, from_version, to_version, engine, diff_json)
+            VALUES (:rid, :from_v, :to_v, :engine, :diff_json)
+        '''), {
+            'rid': recipe_id, 'from_v': prev['version_number'],
+            'to_v': version_number, 'engine': DIFF_ENGINE,
+            'diff_json': json.dumps(diff_versions(prev, snapshot),
+                                    ensure_ascii=False),
+        })
 
 
 def apply_recipe_edit(conn, recipe_id, new_state, change_note=None,
@@ -154,7 +780,8 @@ def apply_recipe_edit(conn, recipe_id, new_state, change_note=None,
         ingredients: list of dicts {name, amount, unit, note,
                                     grocery_category, kitchen_staple}.
                      If omitted/None, existing ingredients are kept untouched.
-                     If provided, ingredients are fully replaced.
+                     If provided, ingredients are fully replaced — written as
+                     a minimal diff against the current rows.
     """
     cur_recipe = conn.execute(
         text("SELECT * FROM recipe WHERE id=:id"), {'id': recipe_id}
@@ -162,84 +789,65 @@ def apply_recipe_edit(conn, recipe_id, new_state, change_note=None,
     if not cur_recipe:
         raise RecipeNotFound(f"Recipe {recipe_id} not found")
 
-    cur_ings = conn.execute(text('''
-        SELECT i.id AS ingredient_id, i.name, ri.amount, ri.unit, ri.note
+    cur_links = conn.execute(text('''
+        SELECT ri.id AS link_id, i.id AS ingredient_id, i.name,
+               ri.amount, ri.unit, ri.note
         FROM recipe_ingredient ri
         JOIN ingredient i ON ri.ingredient_id = i.id
         WHERE ri.recipe_id = :id
+        ORDER BY ri.id
     '''), {'id': recipe_id}).mappings().all()
+    cur_ings = [
+        {k: r[k] for k in ('ingredient_id', 'name', 'amount', 'unit', 'note')}
+        for r in cur_links
+    ]
+
+    # Claim the next version number with a compare-and-swap on
+    # recipe.current_version (migration 016): no rows updated means someone
+    # else committed since the caller (or the SELECT above) saw the recipe.
+    expected = (cur_recipe['current_version'] if expected_version is None
+                else int(expected_version))
+    next_ver = expected + 1
+    claimed = conn.execute(text('''
+        UPDATE recipe SET current_version=:next
+        WHERE id=:id AND current_version=:expected
+    '''), {'next': next_ver, 'id': recipe_id, 'expected': expected}).rowcount
+    if not claimed:
+        current_version = conn.execute(
+            text("SELECT current_version FROM recipe WHERE id=:id"),
+            {'id': recipe_id},
+        ).scalar()
+        raise VersionConflict(current_version, expected)
 
-    current_version = conn.execute(
-        text("SELECT COALESCE(MAX(version_number),0) FROM recipe_version WHERE recipe_id=:id"),
-        {'id': recipe_id},
-    ).scalar() or 0
-
-    if expected_version is not None and int(expected_version) != int(current_version):
-        raise VersionConflict(current_version, expected_version)
-
-    next_ver = current_version + 1
     now = datetime.now(timezone.utc).isoformat()
 
     # 1. Snapshot the pre-edit state.
-    conn.execute(text('''
-        INSERT INTO recipe_version
-            (recipe_id, version_number, title, description, instructions, notes,
-             tags, type, kitchen, ingredients_json, changed_at,
-             changed_by, change_note)
-        VALUES (:recipe_id, :ver, :title, :description, :instructions, :notes,
-                :tags, :type, :kitchen, :ings_json, :changed_at,
-                :changed_by, :change_note)
-    '''), {
-        'recipe_id': recipe_id, 'ver': next_ver,
-        'title': cur_recipe['title'], 'description': cur_recipe['description'],
-        'instructions': cur_recipe['instructions'], 'notes': cur_recipe['notes'],
-        'tags': cur_recipe['tags'],
-        'type': cur_recipe['type'], 'kitchen': cur_recipe['kitchen'],
-        'ings_json': json.dumps([dict(r) for r in cur_ings], ensure_ascii=False),
-        'changed_at': now, 'changed_by': changed_by, 'change_note': change_note,
-    })
-
-    # 2. UPDATE the recipe row (preserve current value for fields not in new_state).
-    conn.execute(text('''
-        UPDATE recipe SET
-            title=:title, description=:description, instructions=:instructions,
-            notes=:notes, tags=:tags, type=:type, kitchen=:kitchen
-        WHERE id=:id
-    '''), {
-        'title': new_state.get('title', cur_recipe['title']),
-        'description': new_state.get('description', cur_recipe['description']),
-        'instructions': new_state.get('instructions', cur_recipe['instructions']),
-        'notes': new_state.get('notes', cur_recipe['notes']),
-        'tags': new_state.get('tags', cur_recipe['tags']),
-        'type': new_state.get('type', cur_recipe['type']),
-        'kitchen': new_state.get('kitchen', cur_recipe['kitchen']),
-        'id': recipe_id,
-    })
+    _insert_version(conn, recipe_id, next_ver, {
+        **{f: cur_recipe[f] for f in ('title', 'description', 'instructions',
+                                      'notes', 'tags', 'type', 'kitchen')},
+        'ingredients_json': json.dumps(cur_ings, ensure_ascii=False),
+    }, now, changed_by, change_note)
+
+    # 2. UPDATE the recipe row (preserve current value for fields not in
+    #    new_state). Skipped when no field actually changes.
+    recipe_fields = ('title', 'description', 'instructions', 'notes',
+                     'tags', 'type', 'kitchen')
+    new_fields = {f: new_state.get(f, cur_recipe[f]) for f in recipe_fields}
+    if any(new_fields[f] != cur_recipe[f] for f in recipe_fields):
+        conn.execute(text('''
+            UPDATE recipe SET
+                title=:title, description=:description, instructions=:instructions,
+                notes=:notes, tags=:tags, type=:type, kitchen=:kitchen
+            WHERE id=:id
+        '''), {**new_fields, 'id': recipe_id})
+        if new_fields['tags'] != cur_recipe['tags']:
+            _sync_recipe_tags(conn, recipe_id, new_fields['tags'])
 
     # 3. Replace ingredient links if a new list was provided.
     if 'ingredients' in new_state and new_state['ingredients'] is not None:
-        conn.execute(text("DELETE FROM recipe_ingredient WHERE recipe_id=:id"),
-                     {'id': recipe_id})
-        for ing in new_state['ingredients']:
-            ing_id = _resolve_or_create_ingredient(
-                conn,
-                name=ing.get('name', ''),
-                grocery_category=ing.get('grocery_category'),
-                default_unit=ing.get('default_unit'),
-                kitchen_staple=ing.get('kitchen_staple', 0),
-            )
-            if not ing_id:
-                continue
-            conn.execute(text('''
-                INSERT INTO recipe_ingredient (recipe_id, ingredient_id, amount, unit, note)
-                VALUES (:recipe_id, :ingredient_id, :amount, :unit, :note)
-            '''), {
-                'recipe_id': recipe_id,
-                'ingredient_id': ing_id,
-                'amount': str(ing.get('amount', '') or ''),
-                'unit': ing.get('unit', '') or '',
-                'note': ing.get('note', '') or '',
-            })
+        if any(_replace_recipe_ingredients(conn, recipe_id, cur_links,
+                                           new_state['ingredients'])):
+            _refresh_recipe_fts(conn, recipe_id)
 
     return {
         'recipe_id': recipe_id,
@@ -266,6 +874,157 @@ def _check_api_token():
     return None
 
 
+# ---------------------------------------------------------------------------
+# Recipe listing — keyset pagination on (title, id), backed by
+# idx_recipe_title_id (migration 009).
+# ---------------------------------------------------------------------------
+
+PAGE_SIZE = 50
+PAGE_SIZE_MAX = 200
+
+# Listing row shape for recipe cards: only what index.html renders, with
+# description cut to LISTING_DESCRIPTION_CHARS. instructions/notes are left
+# out so their (often overflow-page) text is never read for a list; full
+# rows are only loaded by recipe_detail and the edit paths.
+LISTING_DESCRIPTION_CHARS = 160
+LISTING_COLUMNS = f'''
+    r.id, r.title, r.type, r.kitchen,
+    CASE WHEN length(r.description) > {LISTING_DESCRIPTION_CHARS}
+         THEN rtrim(substr(r.description, 1, {LISTING_DESCRIPTION_CHARS})) || '…'
+         ELSE r.description END AS description
+'''
+
+
+def _encode_cursor(title, recipe_id):
+    raw = json.dumps([title, recipe_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """(title, id) from an _encode_cursor string. Raises ValueError if the
+    cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        title, recipe_id = json.loads(raw.decode('utf-8'))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'bad cursor: {cursor!r}') from e
+    if not isinstance(title, str) or not isinstance(recipe_id, int):
+        raise ValueError(f'bad cursor: {cursor!r}')
+    return title, recipe_id
+
+
+def _page_size_arg():
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def _listing_filters(ingredient_ids=(), tags=()):
+    """SQL conditions on `r` (recipe) for the list filters, as (clauses,
+    params). ingredient_ids keeps recipes using any of them; tags keeps
+    recipes carrying all of them (case-insensitive, via recipe_tag)."""
+    clauses, params = [], {}
+    if ingredient_ids:
+        placeholders = ','.join(f':ing{i}' for i in range(len(ingredient_ids)))
+        clauses.append(
+            'r.id IN (SELECT recipe_id FROM recipe_ingredient '
+            f'WHERE ingredient_id IN ({placeholders}))'
+        )
+        params.update({f'ing{i}': v for i, v in enumerate(ingredient_ids)})
+    tags = _split_tags(','.join(tags))
+    if tags:
+        placeholders = ','.join(f':tag{i}' for i in range(len(tags)))
+        clauses.append(
+            'r.id IN (SELECT recipe_id FROM recipe_tag '
+            f'WHERE tag IN ({placeholders}) '
+            'GROUP BY recipe_id HAVING count(*) = :tag_count)'
+        )
+        params.update({f'tag{i}': t for i, t in enumerate(tags)})
+        params['tag_count'] = len(tags)
+    return clauses, params
+
+
+def _recipe_page(conn, after=None, limit=PAGE_SIZE, ingredient_ids=(),
+                 tags=()):
+    """One page of recipes ordered by (title, id), starting after the
+    (title, id) pair `after`, filtered as in _listing_filters. Rows have the
+    LISTING_COLUMNS shape. Returns (rows, next_cursor); next_cursor is None
+    on the last page."""
+    clauses, params = _listing_filters(ingredient_ids, tags)
+    params['limit'] = limit + 1
+    if after is not None:
+        clauses.append('(r.title, r.id) > (:after_title, :after_id)')
+        params.update(after_title=after[0], after_id=after[1])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = conn.execute(text(f'''
+        SELECT {LISTING_COLUMNS} FROM recipe r
+        {where}
+        ORDER BY r.title, r.id
+        LIMIT :limit
+    '''), params).mappings().all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_cursor(rows[-1]['title'], rows[-1]['id'])
+
+
+# ---------------------------------------------------------------------------
+# Full-text search — recipe_fts (FTS5, migration 008), kept in sync by
+# triggers on recipe / ingredient; its ingredients column is refreshed by
+# the writers that change links (_refresh_recipe_fts).
+# ---------------------------------------------------------------------------
+
+# bm25() column weights, in recipe_fts column order: title, description,
+# instructions, notes, tags, ingredients.
+FTS_BM25_WEIGHTS = (10.0, 4.0, 1.0, 1.0, 5.0, 3.0)
+
+_FTS_TERM = re.compile(r'\w+')
+# Snippet highlight markers; control characters can't occur in recipe text,
+# so they survive HTML escaping and are swapped for <mark> afterwards.
+_SNIPPET_OPEN, _SNIPPET_CLOSE = '\x02', '\x03'
+
+
+def _fts_match_query(q):
+    """Turn free text into an FTS5 MATCH expression: every word must match,
+    each as a quoted prefix term so FTS5 syntax in user input is inert.
+    Returns None when q has no searchable words."""
+    terms = _FTS_TERM.findall(q or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{t}"*' for t in terms)
+
+
+def _search_recipes(conn, q, ingredient_ids=(), tags=(), limit=PAGE_SIZE):
+    """BM25-ranked recipe hits for free-text q, best first, filtered as in
+    _listing_filters. Rows have the LISTING_COLUMNS shape plus snippet and
+    rank (lower is better)."""
+    match = _fts_match_query(q)
+    if match is None:
+        return []
+    clauses, params = _listing_filters(ingredient_ids, tags)
+    params.update(match=match, limit=limit,
+                  open=_SNIPPET_OPEN, close=_SNIPPET_CLOSE)
+    extra = ''.join(f' AND {c}' for c in clauses)
+    weights = ', '.join(str(w) for w in FTS_BM25_WEIGHTS)
+    return conn.execute(text(f'''
+        SELECT {LISTING_COLUMNS},
+               snippet(recipe_fts, -1, :open, :close, '…', 16) AS snippet,
+               bm25(recipe_fts, {weights}) AS rank
+        FROM recipe_fts
+        JOIN recipe r ON r.id = recipe_fts.rowid
+        WHERE recipe_fts MATCH :match{extra}
+        ORDER BY rank
+        LIMIT :limit
+    '''), params).mappings().all()
+
+
+@app.template_filter('fts_snippet')
+def _fts_snippet_html(snippet):
+    """Escape a _search_recipes snippet and turn its markers into <mark>."""
+    html = str(escape(snippet or ''))
+    return Markup(html.replace(_SNIPPET_OPEN, '<mark>')
+                      .replace(_SNIPPET_CLOSE, '</mark>'))
+
+
 default_sql_query = (
     "SELECT DISTINCT\n"
     "    recipe_id,\n"
@@ -289,6 +1048,11 @@ def index():
         all_ingredients = conn.execute(text('SELECT id, name FROM ingredient ORDER BY name')).mappings().all()
 
         selected_ingredients = request.args.getlist('ingredients', type=int)
+        selected_tags = _split_tags(','.join(request.args.getlist('tag')))
+        all_tags = _all_tags(conn)
+        q = (request.args.get('q') or '').strip()
+        cursor = request.args.get('cursor') or None
+        next_cursor = None
         group_by = request.args.get('group_by', 'none')
         if group_by not in GROUP_BY_OPTIONS:
             group_by = 'none'
@@ -305,20 +1069,17 @@ def index():
             except SQLAlchemyError as e:
                 error = str(e)
                 recipes = []
+        elif _fts_match_query(q):
+            recipes = _search_recipes(conn, q, selected_ingredients,
+                                      selected_tags)
         else:
-            if selected_ingredients:
-                placeholders = ','.join(f':id{i}' for i in range(len(selected_ingredients)))
-                query = f'''
-                    SELECT DISTINCT r.*
-                    FROM recipe r
-                    JOIN recipe_ingredient ri ON r.id = ri.recipe_id
-                    WHERE ri.ingredient_id IN ({placeholders})
-                    ORDER BY r.title
-                '''
-                params = {f'id{i}': v for i, v in enumerate(selected_ingredients)}
-                recipes = conn.execute(text(query), params).mappings().all()
-            else:
-                recipes = conn.execute(text('SELECT * FROM recipe ORDER BY title')).mappings().all()
+            try:
+                after = _decode_cursor(cursor) if cursor else None
+            except ValueError:
+                after = None
+            recipes, next_cursor = _recipe_page(
+                conn, after, PAGE_SIZE, selected_ingredients, selected_tags
+            )
 
     # Group if requested.
     grouped = None
@@ -336,6 +1097,11 @@ def index():
         group_by=group_by,
         all_ingredients=all_ingredients,
         selected_ingredients=selected_ingredients,
+        all_tags=all_tags,
+        selected_tags=selected_tags,
+        q=q,
+        cursor=cursor,
+        next_cursor=next_cursor,
         advanced_sql=advanced_sql,
         error=error,
         default_sql_query=default_sql_query
@@ -351,7 +1117,7 @@ def sql_sandbox():
     if request.method == 'POST':
         query = request.form['query']
         try:
-            with engine.begin() as conn:
+            with write_engine.begin() as conn:
                 res = conn.execute(text(query))
                 if query.strip().lower().startswith("select"):
                     rows = res.mappings().all()
@@ -380,10 +1146,35 @@ def recipe_detail(recipe_id):
         '''), {'id': recipe_id}).mappings().all()
     return render_template('recipe_detail.html', recipe=recipe, ingredients=ingredients)
 
+def _all_tags(conn):
+    """Distinct tags in use, one spelling per NOCASE-equal group."""
+    return [r[0] for r in conn.execute(text(
+        "SELECT MIN(tag) FROM recipe_tag GROUP BY tag ORDER BY tag"
+    )).all()]
+
+
+# _category_options cache: (epoch, options) for this worker. The epoch is
+# cache_epoch.recipe_categories (migration 011), bumped by triggers on recipe
+# whenever kitchen/type/tags can change, so every gunicorn worker notices
+# writes made by the others.
+_category_cache = (None, None)
+
+
 def _category_options(conn):
     """Distinct existing values for the categorical fields shown in the edit
     form, used to populate <datalist> autocompletes. Free text is still
-    allowed — these are suggestions, not constraints."""
+    allowed — these are suggestions, not constraints.
+
+    Cached per worker; a hit costs one primary-key read of cache_epoch and
+    never touches recipe."""
+    global _category_cache
+    epoch = conn.execute(text(
+        "SELECT epoch FROM cache_epoch WHERE name = 'recipe_categories'"
+    )).scalar()
+    cached_epoch, cached = _category_cache
+    if epoch is not None and epoch == cached_epoch:
+        return cached
+
     kitchens = [r[0] for r in conn.execute(text(
         "SELECT DISTINCT kitchen FROM recipe "
         "WHERE kitchen IS NOT NULL AND TRIM(kitchen) != '' "
@@ -394,23 +1185,26 @@ def _category_options(conn):
         "WHERE type IS NOT NULL AND TRIM(type) != '' "
         "ORDER BY type COLLATE NOCASE"
     )).all()]
-    raw_tags = [r[0] for r in conn.execute(text(
-        "SELECT tags FROM recipe WHERE tags IS NOT NULL AND TRIM(tags) != ''"
-    )).all()]
-    tag_set = set()
-    for raw in raw_tags:
-        for t in raw.split(','):
-            t = t.strip()
-            if t:
-                tag_set.add(t)
-    tags = sorted(tag_set, key=lambda s: s.lower())
-    return {'kitchens': kitchens, 'types': types, 'tags': tags}
+    tags = _all_tags(conn)
+    options = {'kitchens': kitchens, 'types': types, 'tags': tags}
+    # epoch and the lists come from the same read transaction, so the pair
+    # is consistent even if another worker commits meanwhile.
+    if epoch is not None:
+        _category_cache = (epoch, options)
+    return options
 
 
 def _parse_ingredients_textarea(raw):
-    """Parse the legacy 'amount unit name' line-by-line textarea into structured rows."""
+    """Parse the legacy 'amount unit name' line-by-line textarea into structured rows.
+    The amount may contain spaces ("1 1/2", "2 - 3"); see units.split_amount."""
     rows = []
     for line in (raw or '').strip().split('\n'):
+        amount, rest = split_amount(line)
+        if amount and rest:
+            unit, _, name = rest.partition(' ')
+            rows.append({'name': name.strip(), 'amount': amount,
+                         'unit': unit, 'note': ''})
+            continue
         parts = line.strip().split(' ', 2)
         if len(parts) == 3:
             amount, unit, name = parts
@@ -428,7 +1222,8 @@ def _parse_ingredients_textarea(raw):
 @app.route('/recipe/<int:recipe_id>/edit', methods=['GET', 'POST'])
 def edit_recipe(recipe_id):
 
-    with engine.begin() as conn:
+    eng = write_engine if request.method == 'POST' else engine
+    with eng.begin() as conn:
         if request.method == 'POST':
             new_state = {
                 'title': request.form['title'],
@@ -443,10 +1238,13 @@ def edit_recipe(recipe_id):
 
             _backup_before_edit(note=f"web-{recipe_id}")
             try:
-                apply_recipe_edit(
-                    conn, recipe_id, new_state,
-                    change_note=None, changed_by='web',
-                )
+                # Savepoint: a rejected edit must not leave its version row
+                # or recipe UPDATE behind when the outer block commits.
+                with conn.begin_nested():
+                    apply_recipe_edit(
+                        conn, recipe_id, new_state,
+                        change_note=None, changed_by='web',
+                    )
             except RecipeNotFound:
                 return "Recipe not found", 404
             except IngredientNotInCatalog as e:
@@ -497,59 +1295,38 @@ def new_recipe():
         tags = request.form['tags']
 
         try:
-            with engine.begin() as conn:
+            with write_engine.begin() as conn:
                 res = conn.execute(text('''
-                    INSERT INTO recipe (title, description, instructions, notes, kitchen, type, tags)
-                    VALUES (:title, :description, :instructions, :notes, :kitchen, :type, :tags)
+                    INSERT INTO recipe (title, description, instructions, notes, kitchen, type, tags,
+                                        current_version)
+                    VALUES (:title, :description, :instructions, :notes, :kitchen, :type, :tags, 1)
                 '''), {
                     'title': title, 'description': description, 'instructions': instructions,
                     'notes': notes, 'kitchen': kitchen, 'type': type_, 'tags': tags
                 })
                 recipe_id = res.lastrowid
+                _sync_recipe_tags(conn, recipe_id, tags)
 
-            for line in ingredients_text.strip().split('\n'):
-                parts = line.strip().split(' ', 2)
-                if len(parts) == 3:
-                    amount, unit, name = parts
-                elif len(parts) == 2:
-                    amount, unit = parts
-                    name = ''
-                elif len(parts) == 1:
-                    amount = parts[0]
-                    unit = ''
-                    name = ''
-                else:
-                    continue
-                ingredient_id = _resolve_ingredient_id(conn, name)
-                if ingredient_id is None:
-                    raise IngredientNotInCatalog(name, ['grocery_category', 'default_unit'])
-                conn.execute(text('''
-                    INSERT INTO recipe_ingredient (recipe_id, ingredient_id, amount, unit, note)
-                    VALUES (:recipe_id, :ingredient_id, :amount, :unit, :note)
-                '''), {
-                    'recipe_id': recipe_id, 'ingredient_id': ingredient_id,
-                    'amount': amount, 'unit': unit, 'note': ''
-                })
-
-            new_ings = conn.execute(text('''
-                SELECT i.id AS ingredient_id, i.name, ri.amount, ri.unit, ri.note
-                FROM recipe_ingredient ri
-                JOIN ingredient i ON ri.ingredient_id = i.id
-                WHERE ri.recipe_id = :id
-            '''), {'id': recipe_id}).mappings().all()
-            conn.execute(text('''
-                INSERT INTO recipe_version
-                    (recipe_id, version_number, title, description, instructions, notes,
-                     tags, type, kitchen, ingredients_json, changed_at, changed_by, change_note)
-                VALUES (:recipe_id, 1, :title, :description, :instructions, :notes,
-                        :tags, :type, :kitchen, :ings_json, :changed_at, 'web', 'Initial version')
-            '''), {
-                'recipe_id': recipe_id, 'title': title, 'description': description,
-                'instructions': instructions, 'notes': notes,
-                'tags': tags, 'type': type_, 'kitchen': kitchen,
-                'ings_json': json.dumps([dict(r) for r in new_ings], ensure_ascii=False),
-                'changed_at': datetime.now(timezone.utc).isoformat(),
-            })
+                # The web form carries no catalog metadata, so unknown names
+                # raise IngredientNotInCatalog and roll back the recipe row.
+                _insert_recipe_ingredients(
+                    conn, recipe_id, _parse_ingredients_textarea(ingredients_text)
+                )
+                _refresh_recipe_fts(conn, recipe_id)
+
+                new_ings = conn.execute(text('''
+                    SELECT i.id AS ingredient_id, i.name, ri.amount, ri.unit, ri.note
+                    FROM recipe_ingredient ri
+                    JOIN ingredient i ON ri.ingredient_id = i.id
+                    WHERE ri.recipe_id = :id
+                '''), {'id': recipe_id}).mappings().all()
+                _insert_version(conn, recipe_id, 1, {
+                    'title': title, 'description': description,
+                    'instructions': instructions, 'notes': notes,
+                    'tags': tags, 'type': type_, 'kitchen': kitchen,
+                    'ingredients_json': json.dumps([dict(r) for r in new_ings],
+                                                   ensure_ascii=False),
+                }, datetime.now(timezone.utc).isoformat(), 'web', 'Initial version')
         except IngredientNotInCatalog as e:
             empty_recipe = {
                 'id': None, 'title': title, 'description': description,
@@ -579,59 +1356,142 @@ def new_recipe():
 @app.route('/recipe/<int:recipe_id>/delete', methods=['POST'])
 def delete_recipe(recipe_id):
 
-    with engine.begin() as conn:
+    # recipe_version has no FK to recipe (migration 017), so the history
+    # outlives the recipe. The state being deleted is written as a last
+    # version first, so the recipe can be restored from recipe_version.
+    _backup_before_edit(note=f"delete-{recipe_id}")
+    with write_engine.begin() as conn:
+        cur_recipe = conn.execute(
+            text("SELECT * FROM recipe WHERE id=:id"), {'id': recipe_id}
+        ).mappings().first()
+        if cur_recipe is not None:
+            cur_ings = conn.execute(text('''
+                SELECT i.id AS ingredient_id, i.name, ri.amount, ri.unit, ri.note
+                FROM recipe_ingredient ri
+                JOIN ingredient i ON ri.ingredient_id = i.id
+                WHERE ri.recipe_id = :id
+                ORDER BY ri.id
+            '''), {'id': recipe_id}).mappings().all()
+            _insert_version(conn, recipe_id, cur_recipe['current_version'] + 1, {
+                **{f: cur_recipe[f] for f in ('title', 'description', 'instructions',
+                                              'notes', 'tags', 'type', 'kitchen')},
+                'ingredients_json': json.dumps([dict(r) for r in cur_ings],
+                                               ensure_ascii=False),
+            }, datetime.now(timezone.utc).isoformat(), 'web', 'Raderat')
         conn.execute(text('DELETE FROM recipe_ingredient WHERE recipe_id=:id'), {'id': recipe_id})
+        conn.execute(text('DELETE FROM recipe_tag WHERE recipe_id=:id'), {'id': recipe_id})
         conn.execute(text('DELETE FROM recipe WHERE id=:id'), {'id': recipe_id})
     return redirect(url_for('index'))
 
+def _ingredient_library_row(form, ing_id):
+    """The editable catalog fields for one row of the library form."""
+    return {
+        'grocery_category': form.get(f'grocery_category_{ing_id}', '').strip(),
+        'default_unit': form.get(f'default_unit_{ing_id}', '').strip(),
+        'aliases': [a.strip() for a in
+                    form.get(f'aliases_{ing_id}', '').split(',') if a.strip()],
+        'kitchen_staple': 1 if form.get(f'kitchen_staple_{ing_id}') == 'on' else 0,
+    }
+
+
+def _save_ingredient_library(conn, form):
+    """Write the rows the user actually changed in the library form.
+
+    Each row carries its rendered values in a hidden `orig_<id>` field, so
+    untouched rows are dropped without a query. The remaining candidates
+    are compared against the current catalog (one SELECT) and only real
+    changes are written, in a single executemany. Returns the number of
+    rows updated."""
+    candidates = {}
+    for key in form:
+        if not key.startswith('grocery_category_'):
+            continue
+        try:
+            ing_id = int(key[len('grocery_category_'):])
+        except ValueError:
+            continue
+        row = _ingredient_library_row(form, ing_id)
+        if row['grocery_category'] not in ALLOWED_GROCERY_CATEGORIES:
+            continue  # CHECK constraint skulle ändå reject:a
+        if not row['default_unit']:
+            continue
+        try:
+            orig = json.loads(form.get(f'orig_{ing_id}', ''))
+        except ValueError:
+            orig = None  # no/garbled original: compare against the DB only
+        if orig == [row['grocery_category'], row['default_unit'],
+                    ', '.join(row['aliases']), row['kitchen_staple']]:
+            continue
+        candidates[ing_id] = row
+    if not candidates:
+        return 0
+
+    placeholders = ','.join(f':id{i}' for i in range(len(candidates)))
+    current = {
+        r['id']: r for r in conn.execute(text(
+            'SELECT id, grocery_category, default_unit, kitchen_staple, aliases '
+            f'FROM ingredient WHERE id IN ({placeholders})'
+        ), {f'id{i}': v for i, v in enumerate(candidates)}).mappings().all()
+    }
+    updates, alias_changes = [], []
+    for ing_id, row in candidates.items():
+        cur = current.get(ing_id)
+        if cur is None:
+            continue  # deleted since the form was rendered
+        try:
+            cur_aliases = json.loads(cur['aliases'] or '[]')
+        except (TypeError, ValueError):
+            cur_aliases = None
+        if (row['grocery_category'] == cur['grocery_category']
+                and row['default_unit'] == cur['default_unit']
+                and row['kitchen_staple'] == cur['kitchen_staple']
+                and row['aliases'] == cur_aliases):
+            continue
+        updates.append({
+            'id': ing_id, 'gc': row['grocery_category'],
+            'du': row['default_unit'], 'ks': row['kitchen_staple'],
+            'al': json.dumps(row['aliases'], ensure_ascii=False),
+        })
+        if row['aliases'] != cur_aliases:
+            alias_changes.append((ing_id, row['aliases']))
+
+    if updates:
+        conn.execute(
+            text('UPDATE ingredient SET grocery_category=:gc, '
+                 'default_unit=:du, kitchen_staple=:ks, aliases=:al '
+                 'WHERE id=:id'),
+            updates,
+        )
+    for ing_id, aliases in alias_changes:
+        _sync_ingredient_aliases(conn, ing_id, aliases)
+    return len(updates)
+
+
 @app.route('/ingredient_library', methods=['GET', 'POST'])
 def ingredient_library():
 
-    with engine.begin() as conn:
+    eng = write_engine if request.method == 'POST' else engine
+    with eng.begin() as conn:
         if request.method == 'POST':
-            ingredient_ids = [
-                row['id'] for row in conn.execute(text(
-                    'SELECT id FROM ingredient'
-                )).mappings().all()
-            ]
-            for ing_id in ingredient_ids:
-                grocery_category = request.form.get(f'grocery_category_{ing_id}', '').strip()
-                default_unit = request.form.get(f'default_unit_{ing_id}', '').strip()
-                aliases_raw = request.form.get(f'aliases_{ing_id}', '').strip()
-                kitchen_staple = 1 if request.form.get(f'kitchen_staple_{ing_id}') == 'on' else 0
-                if grocery_category not in ALLOWED_GROCERY_CATEGORIES:
-                    continue  # CHECK constraint skulle ändå reject:a
-                if not default_unit:
-                    continue
-                aliases_list = [a.strip() for a in aliases_raw.split(',') if a.strip()]
-                conn.execute(
-                    text('UPDATE ingredient SET grocery_category=:gc, '
-                         'default_unit=:du, kitchen_staple=:ks, aliases=:al '
-                         'WHERE id=:id'),
-                    {'gc': grocery_category, 'du': default_unit,
-                     'ks': kitchen_staple,
-                     'al': json.dumps(aliases_list, ensure_ascii=False),
-                     'id': ing_id}
-                )
-
-        ingredients = conn.execute(text(
-            'SELECT * FROM ingredient ORDER BY name COLLATE NOCASE'
-        )).mappings().all()
+            _save_ingredient_library(conn, request.form)
 
-        ingredient_recipes = {}
-        ingredient_aliases = {}
-        for ing in ingredients:
-            recipe_ids = [
-                str(row['recipe_id']) for row in conn.execute(
-                    text('SELECT recipe_id FROM recipe_ingredient WHERE ingredient_id=:id'), {'id': ing['id']}
-                ).mappings().all()
-            ]
-            ingredient_recipes[ing['id']] = ', '.join(recipe_ids)
-            try:
-                aliases = json.loads(ing['aliases'] or '[]')
-            except (TypeError, ValueError):
-                aliases = []
-            ingredient_aliases[ing['id']] = ', '.join(aliases)
+        # One statement for the whole page: recipe ids per ingredient via
+        # idx_recipe_ingredient_ingredient, aliases flattened with json_each.
+        ingredients = conn.execute(text('''
+            SELECT i.*,
+                   (SELECT group_concat(recipe_id, ', ') FROM (
+                        SELECT recipe_id FROM recipe_ingredient
+                        WHERE ingredient_id = i.id ORDER BY recipe_id
+                    )) AS recipe_ids,
+                   CASE WHEN json_valid(i.aliases) THEN
+                       (SELECT group_concat(value, ', ') FROM json_each(i.aliases))
+                   END AS alias_text
+            FROM ingredient i
+            ORDER BY i.name COLLATE NOCASE
+        ''')).mappings().all()
+
+        ingredient_recipes = {ing['id']: ing['recipe_ids'] or '' for ing in ingredients}
+        ingredient_aliases = {ing['id']: ing['alias_text'] or '' for ing in ingredients}
 
     return render_template(
         'ingredient_library.html',
@@ -641,19 +1501,95 @@ def ingredient_library():
         allowed_categories=sorted(ALLOWED_GROCERY_CATEGORIES),
     )
 
+def _version_page(conn, recipe_id, before=None, limit=PAGE_SIZE):
+    """One page of a recipe's version metadata, newest first, below version
+    number `before`. Keyset on (recipe_id, version_number), so the UNIQUE
+    index serves it as one range scan however long the history is; the
+    (possibly compressed) body columns are never read. Returns (rows,
+    next_cursor); next_cursor is None on the last page."""
+    params = {'id': recipe_id, 'limit': limit + 1}
+    below = ''
+    if before is not None:
+        below = 'AND version_number < :before'
+        params['before'] = before
+    rows = conn.execute(text(f'''
+        SELECT id, version_number, changed_at, changed_by, change_note, title
+        FROM recipe_version WHERE recipe_id=:id {below}
+        ORDER BY version_number DESC
+        LIMIT :limit
+    '''), params).mappings().all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1]['version_number']
+
+
+def _version_cursor_arg():
+    """The `cursor` query arg as a version number, None if absent. Raises
+    ValueError if it isn't a positive integer."""
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return None
+    if not cursor.isdigit() or int(cursor) < 1:
+        raise ValueError(f'bad cursor: {cursor!r}')
+    return int(cursor)
+
+
 @app.route('/recipe/<int:recipe_id>/history')
 def recipe_history(recipe_id):
+    try:
+        cursor = _version_cursor_arg()
+    except ValueError:
+        cursor = None
     with engine.connect() as conn:
         recipe = conn.execute(
             text("SELECT id, title FROM recipe WHERE id=:id"), {'id': recipe_id}
         ).mappings().first()
         if not recipe:
             return "Recipe not found", 404
-        versions = conn.execute(text('''
-            SELECT id, version_number, changed_at, changed_by, change_note, title
-            FROM recipe_version WHERE recipe_id=:id ORDER BY version_number DESC
-        '''), {'id': recipe_id}).mappings().all()
-    return render_template('recipe_history.html', recipe=recipe, versions=versions)
+        versions, next_cursor = _version_page(conn, recipe_id, cursor)
+    return render_template('recipe_history.html', recipe=recipe,
+                           versions=versions, cursor=cursor,
+                           next_cursor=next_cursor)
+
+
+DIFF_CACHE_SIZE = 128
+
+# (recipe_id, from, to) -> diff. Versions never change once written, so
+# entries never go stale; the bound only caps memory.
+_diff_cache = OrderedDict()
+_diff_cache_lock = threading.Lock()
+
+
+def _version_diff(conn, recipe_id, v_from, v_to, adjacent):
+    """diff_versions() output for two versions: from the LRU, else from
+    recipe_version_diff for adjacent versions, else computed from the
+    materialized versions."""
+    key = (recipe_id, v_from, v_to)
+    with _diff_cache_lock:
+        hit = _diff_cache.get(key)
+        if hit is not None:
+            _diff_cache.move_to_end(key)
+            return hit
+
+    diff = None
+    if adjacent:
+        row = conn.execute(text('''
+            SELECT engine, diff_json FROM recipe_version_diff
+            WHERE recipe_id = :rid AND from_version = :a AND to_version = :b
+        '''), {'rid': recipe_id, 'a': v_from, 'b': v_to}).first()
+        if row and row.engine == DIFF_ENGINE:
+            diff = json.loads(row.diff_json)
+    if diff is None:
+        versions = load_versions(conn, recipe_id, (v_from, v_to))
+        diff = diff_versions(versions[v_from], versions[v_to])
+
+    with _diff_cache_lock:
+        _diff_cache[key] = diff
+        _diff_cache.move_to_end(key)
+        while len(_diff_cache) > DIFF_CACHE_SIZE:
+            _diff_cache.popitem(last=False)
+    return diff
 
 
 @app.route('/recipe/<int:recipe_id>/diff')
@@ -668,55 +1604,36 @@ def recipe_diff(recipe_id):
             return "Recipe not found", 404
 
         if v_from is None or v_to is None:
-            versions = conn.execute(text('''
-                SELECT version_number FROM recipe_version WHERE recipe_id=:id ORDER BY version_number
-            '''), {'id': recipe_id}).mappings().all()
-            nums = [v['version_number'] for v in versions]
+            nums = conn.execute(text('''
+                SELECT version_number FROM recipe_version WHERE recipe_id=:id
+                ORDER BY version_number DESC LIMIT 2
+            '''), {'id': recipe_id}).scalars().all()
             if len(nums) < 2:
                 return render_template('recipe_diff.html', recipe=recipe,
                                        error="Behöver minst 2 versioner för att visa diff.", diff=None)
-            v_from, v_to = nums[-2], nums[-1]
-
-        ver_a = conn.execute(text(
-            "SELECT * FROM recipe_version WHERE recipe_id=:rid AND version_number=:v"
-        ), {'rid': recipe_id, 'v': v_from}).mappings().first()
-        ver_b = conn.execute(text(
-            "SELECT * FROM recipe_version WHERE recipe_id=:rid AND version_number=:v"
-        ), {'rid': recipe_id, 'v': v_to}).mappings().first()
-
+            v_to, v_from = nums
+
+        # Metadata only; bodies are materialized just when the diff isn't
+        # cached or stored.
+        meta = {r['version_number']: r for r in conn.execute(text('''
+            SELECT version_number, changed_at, changed_by,
+                   (SELECT MAX(p.version_number) FROM recipe_version p
+                    WHERE p.recipe_id = v.recipe_id
+                      AND p.version_number < v.version_number) AS prev_version
+            FROM recipe_version v
+            WHERE recipe_id=:rid AND version_number IN (:a, :b)
+        '''), {'rid': recipe_id, 'a': v_from, 'b': v_to}).mappings().all()}
+        ver_a, ver_b = meta.get(v_from), meta.get(v_to)
         if not ver_a or not ver_b:
             return "Version not found", 404
 
-    text_fields = ['title', 'description', 'instructions', 'notes', 'tags', 'type', 'kitchen']
-    field_diffs = {}
-    for f in text_fields:
-        a_val = ver_a[f] or ''
-        b_val = ver_b[f] or ''
-        if a_val != b_val:
-            a_lines = a_val.splitlines(keepends=True)
-            b_lines = b_val.splitlines(keepends=True)
-            diff_lines = list(difflib.ndiff(a_lines, b_lines))
-            field_diffs[f] = diff_lines
-
-    ings_a = {i['name']: i for i in json.loads(ver_a['ingredients_json'] or '[]')}
-    ings_b = {i['name']: i for i in json.loads(ver_b['ingredients_json'] or '[]')}
-    all_names = sorted(set(ings_a) | set(ings_b))
-    ing_diff = []
-    for name in all_names:
-        if name in ings_a and name in ings_b:
-            a, b = ings_a[name], ings_b[name]
-            if a.get('amount') != b.get('amount') or a.get('unit') != b.get('unit') or a.get('note') != b.get('note'):
-                ing_diff.append(('changed', name, ings_a[name], ings_b[name]))
-            else:
-                ing_diff.append(('same', name, ings_a[name], ings_b[name]))
-        elif name in ings_a:
-            ing_diff.append(('removed', name, ings_a[name], None))
-        else:
-            ing_diff.append(('added', name, None, ings_b[name]))
+        diff = _version_diff(conn, recipe_id, v_from, v_to,
+                             ver_b['prev_version'] == v_from)
 
     return render_template('recipe_diff.html', recipe=recipe,
                            ver_a=ver_a, ver_b=ver_b,
-                           field_diffs=field_diffs, ing_diff=ing_diff,
+                           field_diffs=diff['fields'],
+                           ing_diff=diff['ingredients'],
                            v_from=v_from, v_to=v_to)
 
 
@@ -724,46 +1641,45 @@ def recipe_diff(recipe_id):
 # JSON API for the edit-recipe skill (Cowork & Claude Code).
 # ---------------------------------------------------------------------------
 
-@app.route('/api/recipe/<int:recipe_id>', methods=['GET'])
-def api_recipe_get(recipe_id):
-    auth_err = _check_api_token()
-    if auth_err is not None:
-        return auth_err
-
-    with engine.connect() as conn:
-        recipe = conn.execute(
-            text("SELECT * FROM recipe WHERE id=:id"), {'id': recipe_id}
-        ).mappings().first()
-        if not recipe:
-            return jsonify({'error': 'Recipe not found'}), 404
-
-        ings = conn.execute(text('''
-            SELECT i.id AS ingredient_id, i.name, i.grocery_category,
+RECIPE_TEXT_FIELDS = ('title', 'description', 'instructions', 'notes',
+                      'tags', 'type', 'kitchen')
+RECIPE_API_FIELDS = RECIPE_TEXT_FIELDS + ('current_version_number', 'ingredients')
+RECIPE_BATCH_MAX = 200
+
+
+def _recipe_payloads(conn, recipe_ids, fields=RECIPE_API_FIELDS):
+    """API payloads for many recipes from at most two set-based queries
+    (recipes with their current_version, ingredient links) — the latter
+    only when `fields` asks for it. Returns {recipe_id: payload}; ids that
+    don't exist are absent."""
+    if not recipe_ids:
+        return {}
+    placeholders = ','.join(f':id{i}' for i in range(len(recipe_ids)))
+    params = {f'id{i}': v for i, v in enumerate(recipe_ids)}
+    columns = ['id'] + [f for f in RECIPE_TEXT_FIELDS if f in fields]
+    if 'current_version_number' in fields:
+        columns.append('current_version AS current_version_number')
+    payloads = {
+        r['id']: dict(r) for r in conn.execute(text(
+            f"SELECT {', '.join(columns)} FROM recipe WHERE id IN ({placeholders})"
+        ), params).mappings().all()
+    }
+    if not payloads:
+        return {}
+
+    if 'ingredients' in fields:
+        for payload in payloads.values():
+            payload['ingredients'] = []
+        for r in conn.execute(text(f'''
+            SELECT ri.recipe_id, i.id AS ingredient_id, i.name, i.grocery_category,
                    i.default_unit, i.kitchen_staple, i.aliases,
                    ri.amount, ri.unit, ri.note
             FROM recipe_ingredient ri
             JOIN ingredient i ON ri.ingredient_id = i.id
-            WHERE ri.recipe_id = :id
-            ORDER BY i.name
-        '''), {'id': recipe_id}).mappings().all()
-
-        current_version = conn.execute(
-            text("SELECT COALESCE(MAX(version_number),0) FROM recipe_version WHERE recipe_id=:id"),
-            {'id': recipe_id},
-        ).scalar() or 0
-
-    return jsonify({
-        'id': recipe['id'],
-        'title': recipe['title'],
-        'description': recipe['description'],
-        'instructions': recipe['instructions'],
-        'notes': recipe['notes'],
-        'tags': recipe['tags'],
-        'type': recipe['type'],
-        'kitchen': recipe['kitchen'],
-        'current_version_number': current_version,
-        'ingredients': [
-            {
+            WHERE ri.recipe_id IN ({placeholders})
+            ORDER BY ri.recipe_id, i.name
+        '''), params).mappings().all():
+            payloads[r['recipe_id']]['ingredients'].append({
                 'ingredient_id': r['ingredient_id'],
                 'name': r['name'],
                 'amount': r['amount'],
@@ -773,89 +1689,228 @@ def api_recipe_get(recipe_id):
                 'default_unit': r['default_unit'],
                 'kitchen_staple': r['kitchen_staple'],
                 'aliases': json.loads(r['aliases'] or '[]'),
-            } for r in ings
-        ],
+            })
+    return payloads
+
+
+@app.route('/api/recipe/<int:recipe_id>', methods=['GET'])
+def api_recipe_get(recipe_id):
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    with engine.connect() as conn:
+        payload = _recipe_payloads(conn, [recipe_id]).get(recipe_id)
+    if payload is None:
+        return jsonify({'error': 'Recipe not found'}), 404
+    return jsonify(payload)
+
+
+@app.route('/api/recipe/<int:recipe_id>/versions', methods=['GET'])
+def api_recipe_versions(recipe_id):
+    """Version history metadata, newest first, `limit` per page: pass the
+    returned `next` back as `cursor` until it is null. Bodies are fetched
+    one version at a time from /api/recipe/<id>/versions/<n>."""
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    try:
+        cursor = _version_cursor_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = _page_size_arg()
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT 1 FROM recipe WHERE id=:id"),
+                        {'id': recipe_id}).first() is None:
+            return jsonify({'error': 'Recipe not found'}), 404
+        rows, next_cursor = _version_page(conn, recipe_id, cursor, limit)
+    return jsonify({
+        'recipe_id': recipe_id,
+        'versions': [{k: r[k] for k in ('version_number', 'changed_at',
+                                         'changed_by', 'change_note', 'title')}
+                     for r in rows],
+        'next': next_cursor,
+    })
+
+
+@app.route('/api/recipe/<int:recipe_id>/versions/<int:version_number>',
+           methods=['GET'])
+def api_recipe_version_get(recipe_id, version_number):
+    """One stored version in full — the recipe as it was before the edit
+    that wrote it — with the ingredients as snapshotted then."""
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    with engine.connect() as conn:
+        ver = load_versions(conn, recipe_id, [version_number]).get(version_number)
+    if ver is None:
+        return jsonify({'error': 'Version not found'}), 404
+    payload = {'recipe_id': recipe_id}
+    payload.update({k: ver[k] for k in ('version_number', 'changed_at',
+                                        'changed_by', 'change_note')})
+    payload.update({f: ver[f] for f in SNAPSHOT_FIELDS
+                    if f != 'ingredients_json'})
+    payload['ingredients'] = json.loads(ver['ingredients_json'] or '[]')
+    return jsonify(payload)
+
+
+@app.route('/api/recipes', methods=['GET'])
+def api_recipes_batch():
+    """Many recipes in one round trip: ?ids=1,2,3 (up to RECIPE_BATCH_MAX)
+    and optionally fields=title,ingredients,... to leave out large text
+    columns (id is always included). Recipes come back in the order asked
+    for; ids that don't exist are listed under `missing`."""
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    try:
+        ids = list(dict.fromkeys(
+            int(x) for x in (request.args.get('ids') or '').split(',') if x.strip()
+        ))
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+    if not ids:
+        return jsonify({'error': 'ids is required'}), 400
+    if len(ids) > RECIPE_BATCH_MAX:
+        return jsonify({'error': f'at most {RECIPE_BATCH_MAX} ids per request'}), 400
+
+    fields = RECIPE_API_FIELDS
+    if request.args.get('fields'):
+        fields = tuple(f.strip() for f in request.args['fields'].split(',') if f.strip())
+        unknown = sorted(set(fields) - set(RECIPE_API_FIELDS) - {'id'})
+        if unknown:
+            return jsonify({'error': f'unknown fields: {unknown}',
+                            'allowed': list(RECIPE_API_FIELDS)}), 400
+
+    with engine.connect() as conn:
+        payloads = _recipe_payloads(conn, ids, fields)
+    return jsonify({
+        'recipes': [payloads[rid] for rid in ids if rid in payloads],
+        'missing': [rid for rid in ids if rid not in payloads],
     })
 
 
 @app.route('/api/recipe/search', methods=['GET'])
 def api_recipe_search():
-    """Lightweight title search so the skill can resolve a name to an id."""
+    """Full-text search so the skill can resolve a name to an id. With q,
+    returns the top `limit` hits BM25-ranked over title, description,
+    instructions, notes, tags and ingredient names, each with a snippet
+    where **hits** are marked. Without q, lists recipes by (title, id) one
+    page at a time: pass the returned `next` back as `cursor` until it is
+    null. Repeat `tag` to keep only recipes carrying all given tags."""
     auth_err = _check_api_token()
     if auth_err is not None:
         return auth_err
 
     q = (request.args.get('q') or '').strip()
+    tags = request.args.getlist('tag')
+    limit = _page_size_arg()
     with engine.connect() as conn:
         if q:
-            rows = conn.execute(text(
-                "SELECT id, title, type, kitchen FROM recipe "
-                "WHERE LOWER(title) LIKE LOWER(:q) ORDER BY title"
-            ), {'q': f"%{q}%"}).mappings().all()
-        else:
-            rows = conn.execute(text(
-                "SELECT id, title, type, kitchen FROM recipe ORDER BY title"
-            )).mappings().all()
-    return jsonify({'results': [dict(r) for r in rows]})
+            rows = _search_recipes(conn, q, tags=tags, limit=limit)
+            results = [
+                {'id': r['id'], 'title': r['title'], 'type': r['type'],
+                 'kitchen': r['kitchen'], 'rank': r['rank'],
+                 'snippet': r['snippet'].replace(_SNIPPET_OPEN, '**')
+                                        .replace(_SNIPPET_CLOSE, '**')}
+                for r in rows
+            ]
+            return jsonify({'results': results, 'next': None})
+        cursor = request.args.get('cursor')
+        try:
+            after = _decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        rows, next_cursor = _recipe_page(conn, after, limit, tags=tags)
+    return jsonify({
+        'results': [{'id': r['id'], 'title': r['title'], 'type': r['type'],
+                     'kitchen': r['kitchen']} for r in rows],
+        'next': next_cursor,
+    })
 
 
-@app.route('/api/recipe/<int:recipe_id>/commit-edit', methods=['POST'])
-def api_recipe_commit_edit(recipe_id):
-    auth_err = _check_api_token()
-    if auth_err is not None:
-        return auth_err
+COMMIT_EDIT_FIELDS = {'title', 'description', 'instructions', 'notes',
+                      'tags', 'type', 'kitchen', 'ingredients'}
+
 
-    payload = request.get_json(silent=True)
+def _parse_commit_edit(payload):
+    """Validate one commit-edit body. Returns (new_state, change_note,
+    expected_version, changed_by); raises ValueError with the client-facing
+    message if the body is malformed."""
     if not isinstance(payload, dict):
-        return jsonify({'error': 'Body must be a JSON object'}), 400
+        raise ValueError('Body must be a JSON object')
 
     change_note = payload.get('change_note')
     if not change_note or not isinstance(change_note, str):
-        return jsonify({'error': 'change_note (non-empty string) is required'}), 400
+        raise ValueError('change_note (non-empty string) is required')
 
     expected_version = payload.get('expected_version_number')
     if expected_version is not None:
         try:
             expected_version = int(expected_version)
         except (TypeError, ValueError):
-            return jsonify({'error': 'expected_version_number must be an integer'}), 400
+            raise ValueError('expected_version_number must be an integer') from None
 
-    allowed = {'title', 'description', 'instructions', 'notes',
-               'tags', 'type', 'kitchen', 'ingredients'}
-    new_state = {k: v for k, v in payload.items() if k in allowed}
+    new_state = {k: v for k, v in payload.items() if k in COMMIT_EDIT_FIELDS}
 
     if 'ingredients' in new_state and new_state['ingredients'] is not None:
         if not isinstance(new_state['ingredients'], list):
-            return jsonify({'error': 'ingredients must be a list'}), 400
+            raise ValueError('ingredients must be a list')
         for i, ing in enumerate(new_state['ingredients']):
             if not isinstance(ing, dict) or not (ing.get('name') or '').strip():
-                return jsonify({'error': f'ingredients[{i}] must have a non-empty name'}), 400
+                raise ValueError(f'ingredients[{i}] must have a non-empty name')
+
+    return new_state, change_note, expected_version, payload.get('changed_by', 'chat')
+
+
+def _commit_edit_error(exc):
+    """(body, status) for an apply_recipe_edit failure."""
+    if isinstance(exc, RecipeNotFound):
+        return {'error': 'Recipe not found'}, 404
+    if isinstance(exc, VersionConflict):
+        return {
+            'error': 'Version conflict',
+            'expected_version_number': exc.expected_version,
+            'current_version_number': exc.current_version,
+            'hint': 'Re-fetch the recipe via GET /api/recipe/<id> and rebuild your edit.',
+        }, 409
+    if isinstance(exc, IngredientNotInCatalog):
+        return {
+            'error': 'Ingredient not in catalog',
+            'ingredient_name': exc.name,
+            'missing_fields': exc.missing,
+            'hint': str(exc),
+        }, 400
+    raise exc
+
+
+@app.route('/api/recipe/<int:recipe_id>/commit-edit', methods=['POST'])
+def api_recipe_commit_edit(recipe_id):
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    try:
+        new_state, change_note, expected_version, changed_by = \
+            _parse_commit_edit(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     _backup_before_edit(note=f"api-{recipe_id}")
     try:
-        with engine.begin() as conn:
+        with write_engine.begin() as conn:
             result = apply_recipe_edit(
                 conn, recipe_id, new_state,
                 change_note=change_note,
-                changed_by=payload.get('changed_by', 'chat'),
+                changed_by=changed_by,
                 expected_version=expected_version,
             )
-    except RecipeNotFound:
-        return jsonify({'error': 'Recipe not found'}), 404
-    except VersionConflict as e:
-        return jsonify({
-            'error': 'Version conflict',
-            'expected_version_number': e.expected_version,
-            'current_version_number': e.current_version,
-            'hint': 'Re-fetch the recipe via GET /api/recipe/<id> and rebuild your edit.',
-        }), 409
-    except IngredientNotInCatalog as e:
-        return jsonify({
-            'error': 'Ingredient not in catalog',
-            'ingredient_name': e.name,
-            'missing_fields': e.missing,
-            'hint': str(e),
-        }), 400
+    except (RecipeNotFound, VersionConflict, IngredientNotInCatalog) as e:
+        body, status = _commit_edit_error(e)
+        return jsonify(body), status
     except SQLAlchemyError as e:
         return jsonify({'error': f'Database error: {e}'}), 500
 
@@ -868,6 +1923,252 @@ def api_recipe_commit_edit(recipe_id):
     })
 
 
+@app.route('/api/recipes/commit-edit', methods=['POST'])
+def api_recipes_commit_batch():
+    """Apply many recipe edits in one write transaction.
+
+    Body: {"edits": [{"recipe_id": 1, "change_note": "...", ...}, ...],
+           "atomic": true}
+    Each edit takes the same fields as /api/recipe/<id>/commit-edit,
+    including its own expected_version_number. One pre-edit backup is taken
+    for the whole batch.
+
+    Every edit runs in its own savepoint and gets a result entry. With
+    atomic (the default) any failure rolls back the whole batch and the
+    response carries the first failure's status; with "atomic": false the
+    failed edits are skipped and the rest commit."""
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('edits'), list) \
+            or not body['edits']:
+        return jsonify({'error': 'Body must be {"edits": [...]} with at least one edit'}), 400
+    edits = body['edits']
+    if len(edits) > RECIPE_BATCH_MAX:
+        return jsonify({'error': f'at most {RECIPE_BATCH_MAX} edits per request'}), 400
+    atomic = body.get('atomic', True) is not False
+
+    parsed, invalid = [], []
+    for i, edit in enumerate(edits):
+        try:
+            recipe_id = int(edit.get('recipe_id')) if isinstance(edit, dict) else None
+        except (TypeError, ValueError):
+            recipe_id = None
+        if recipe_id is None:
+            invalid.append({'index': i, 'error': 'recipe_id (integer) is required'})
+            continue
+        try:
+            parsed.append((i, recipe_id, *_parse_commit_edit(edit)))
+        except ValueError as e:
+            invalid.append({'index': i, 'recipe_id': recipe_id, 'error': str(e)})
+    if invalid:
+        return jsonify({'error': 'Invalid edits', 'invalid': invalid}), 400
+
+    _backup_before_edit(note=f"api-batch-{len(parsed)}")
+    results, first_failure = [], None
+    try:
+        with write_engine.connect() as conn:
+            trans = conn.begin()
+            for i, recipe_id, new_state, change_note, expected_version, changed_by in parsed:
+                try:
+                    with conn.begin_nested():
+                        result = apply_recipe_edit(
+                            conn, recipe_id, new_state,
+                            change_note=change_note,
+                            changed_by=changed_by,
+                            expected_version=expected_version,
+                        )
+                except (RecipeNotFound, VersionConflict, IngredientNotInCatalog) as e:
+                    err, status = _commit_edit_error(e)
+                    results.append({'index': i, 'recipe_id': recipe_id,
+                                    'ok': False, 'status': status, **err})
+                    first_failure = first_failure or status
+                    continue
+                results.append({
+                    'index': i, 'ok': True,
+                    'recipe_id': result['recipe_id'],
+                    'new_version_number': result['new_version_number'],
+                    'changed_at': result['changed_at'],
+                })
+            committed = not (atomic and first_failure)
+            if committed:
+                trans.commit()
+            else:
+                trans.rollback()
+    except SQLAlchemyError as e:
+        return jsonify({'error': f'Database error: {e}'}), 500
+
+    return jsonify({
+        'ok': first_failure is None,
+        'committed': committed,
+        'applied': sum(1 for r in results if r['ok']) if committed else 0,
+        'results': results,
+    }), (first_failure if not committed else 200)
+
+
+@app.route('/api/backup/status', methods=['GET'])
+def api_backup_status():
+    """Queue depth and last-snapshot age of this worker's BackupService."""
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    service = _get_backup_service()
+    if service is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'pid': os.getpid(), **service.status()})
+
+
+# ---------------------------------------------------------------------------
+# Shopping list — built from the parsed amount columns (migration 012) and
+# memoized per recipe set.
+# ---------------------------------------------------------------------------
+
+SHOPPING_LIST_CACHE_SIZE = 256
+SHOPPING_LIST_MAX_MULTIPLIER = 100
+
+# (recipe id, multiplier) set -> (_shopping_list_stamp, result). LRU, per worker.
+_shopping_list_cache = OrderedDict()
+_shopping_list_cache_lock = threading.Lock()
+
+
+def _shopping_list_stamp(conn, recipe_ids):
+    """Cache stamp for a shopping list: cache_epoch.ingredient_catalog
+    (migration 011, bumped when an ingredient's name, category, default
+    unit or staple flag changes) and (recipe_id, current_version) for each
+    id, by primary key. Every edit bumps recipe.current_version, so the
+    stamp changes whenever a member or the catalog changes — in any
+    worker."""
+    epoch = conn.execute(text(
+        "SELECT epoch FROM cache_epoch WHERE name = 'ingredient_catalog'"
+    )).scalar()
+    placeholders = ','.join(f':id{i}' for i in range(len(recipe_ids)))
+    return epoch, tuple(conn.execute(text(f'''
+        SELECT id, current_version FROM recipe
+        WHERE id IN ({placeholders}) ORDER BY id
+    '''), {f'id{i}': v for i, v in enumerate(recipe_ids)}).all())
+
+
+def _build_shopping_list(conn, multipliers):
+    """Shopping list for {recipe_id: multiplier}: the selected recipes and
+    [(grocery_category, [item, ...]), ...] with one item per ingredient.
+    Amounts are summed in SQL per (ingredient, canonical unit), scaled per
+    recipe, then merged into the unit of each ingredient's default_unit
+    (scripts/units.py). Amounts that don't parse are passed through as
+    written.
+
+    Memoized per recipe set and multipliers; an entry is reused only while
+    no member recipe has a newer recipe_version and the ingredient catalog
+    hasn't changed. Returns (result, cached)."""
+    key = tuple(sorted(multipliers.items()))
+    ids = [rid for rid, _ in key]
+    stamp = _shopping_list_stamp(conn, ids)
+    with _shopping_list_cache_lock:
+        hit = _shopping_list_cache.get(key)
+        if hit is not None and stamp[0] is not None and hit[0] == stamp:
+            _shopping_list_cache.move_to_end(key)
+            return hit[1], True
+
+    selection = ' UNION ALL '.join(
+        f'SELECT :id{i} AS recipe_id, :m{i} AS multiplier' for i in range(len(key))
+    )
+    params = {}
+    for i, (rid, mult) in enumerate(key):
+        params[f'id{i}'], params[f'm{i}'] = rid, mult
+    rows = conn.execute(text(f'''
+        WITH sel AS ({selection})
+        SELECT i.id AS ingredient_id, i.name, i.grocery_category,
+               i.kitchen_staple, i.default_unit, ri.unit_canonical,
+               SUM(ri.amount_max * sel.multiplier) AS amount_max,
+               group_concat(CASE
+                   WHEN ri.amount_max IS NULL AND trim(coalesce(ri.amount, '')) != ''
+                   THEN trim(ri.amount || ' ' || coalesce(ri.unit, ''))
+               END, char(31)) AS unparsed
+        FROM sel
+        JOIN recipe_ingredient ri ON ri.recipe_id = sel.recipe_id
+        JOIN ingredient i ON ri.ingredient_id = i.id
+        GROUP BY i.id, ri.unit_canonical
+    '''), params).mappings().all()
+    recipes = [
+        {'id': r['id'], 'title': r['title'], 'multiplier': multipliers[r['id']]}
+        for r in conn.execute(text(f'''
+            WITH sel AS ({selection})
+            SELECT r.id, r.title FROM sel JOIN recipe r ON r.id = sel.recipe_id
+            ORDER BY r.title
+        '''), params).mappings().all()
+    ]
+
+    catalog = {row['ingredient_id']: row for row in rows}
+    items = []
+    for entry in aggregate_quantities(rows):
+        ing = catalog[entry['ingredient_id']]
+        items.append({
+            'name': entry['name'],
+            'amount': entry['amount'],
+            'parts': [{'value': round(v, 3), 'unit': g} for v, g in entry['parts']],
+            'unparsed': entry['texts'],
+            'grocery_category': ing['grocery_category'] or 'Övrigt',
+            'kitchen_staple': ing['kitchen_staple'] or 0,
+        })
+    items.sort(key=lambda x: (x['grocery_category'], x['name']))
+    grouped = [(cat, list(group)) for cat, group in
+               groupby(items, key=lambda x: x['grocery_category'])]
+
+    result = {'recipes': recipes, 'categories': grouped}
+    with _shopping_list_cache_lock:
+        _shopping_list_cache[key] = (stamp, result)
+        _shopping_list_cache.move_to_end(key)
+        while len(_shopping_list_cache) > SHOPPING_LIST_CACHE_SIZE:
+            _shopping_list_cache.popitem(last=False)
+    return result, False
+
+
+@app.route('/api/shopping-list', methods=['GET'])
+def api_shopping_list():
+    """Aggregated shopping list for a set of recipes.
+
+    ?ids=1,2,3              recipe ids (required)
+    &multipliers=1:2,3:0.5  optional servings multiplier per recipe (default 1)
+
+    Categories come back in store order, items with a display `amount` and
+    machine-readable `parts` (value in g / ml / count unit), plus the
+    non-numeric amounts as written in `unparsed`. Staples are
+    included and flagged; clients decide whether to hide them."""
+    auth_err = _check_api_token()
+    if auth_err is not None:
+        return auth_err
+
+    try:
+        ids = [int(x) for x in (request.args.get('ids') or '').split(',') if x.strip()]
+        multipliers = {rid: 1.0 for rid in ids}
+        for item in filter(None, (request.args.get('multipliers') or '').split(',')):
+            rid, _, mult = item.partition(':')
+            rid, mult = int(rid), float(mult)
+            if rid not in multipliers:
+                return jsonify({'error': f'multiplier for recipe {rid} not in ids'}), 400
+            if not 0 < mult <= SHOPPING_LIST_MAX_MULTIPLIER:
+                return jsonify({'error': f'multiplier must be in (0, {SHOPPING_LIST_MAX_MULTIPLIER}]'}), 400
+            multipliers[rid] = mult
+    except ValueError:
+        return jsonify({'error': 'ids must be integers, multipliers id:number pairs'}), 400
+    if not ids:
+        return jsonify({'error': 'ids is required'}), 400
+
+    with engine.connect() as conn:
+        result, cached = _build_shopping_list(conn, multipliers)
+    missing = sorted(set(multipliers) - {r['id'] for r in result['recipes']})
+    if missing:
+        return jsonify({'error': 'Recipe not found', 'missing': missing}), 404
+    return jsonify({
+        'recipes': result['recipes'],
+        'categories': [{'category': cat, 'items': items}
+                       for cat, items in result['categories']],
+        'cached': cached,
+    })
+
+
 @app.route('/shopping-list', methods=['GET', 'POST'])
 def shopping_list():
     with engine.connect() as conn:
@@ -888,61 +2189,11 @@ def shopping_list():
                                error="Välj minst ett recept.")
 
     with engine.connect() as conn:
-        placeholders = ','.join([':id' + str(i) for i in range(len(selected_ids))])
-        params = {f'id{i}': v for i, v in enumerate(selected_ids)}
-        rows = conn.execute(text(f'''
-            SELECT i.name, i.grocery_category, i.kitchen_staple,
-                   ri.amount, ri.unit
-            FROM recipe_ingredient ri
-            JOIN ingredient i ON ri.ingredient_id = i.id
-            WHERE ri.recipe_id IN ({placeholders})
-        '''), params).mappings().all()
-
-        selected_recipes = conn.execute(text(f'''
-            SELECT id, title FROM recipe WHERE id IN ({placeholders})
-        '''), params).mappings().all()
-
-    from collections import defaultdict
-    agg = defaultdict(lambda: {'amounts': [], 'grocery_category': '', 'kitchen_staple': 0})
-    for row in rows:
-        key = (row['name'].strip().lower(), (row['unit'] or '').strip().lower())
-        entry = agg[key]
-        entry['display_name'] = row['name']
-        entry['grocery_category'] = row['grocery_category'] or 'Övrigt'
-        entry['kitchen_staple'] = row['kitchen_staple'] or 0
-        entry['unit'] = row['unit'] or ''
-        try:
-            entry['amounts'].append(float(row['amount'] or 0))
-        except (ValueError, TypeError):
-            entry['amounts'].append(row['amount'] or '')
-
-    items = []
-    for (name_norm, unit_norm), entry in agg.items():
-        amounts = entry['amounts']
-        if all(isinstance(a, float) for a in amounts):
-            total = sum(amounts)
-            amount_str = str(int(total)) if total == int(total) else str(total)
-        else:
-            amount_str = ' + '.join(str(a) for a in amounts if a)
-
-        items.append({
-            'name': entry['display_name'],
-            'amount': amount_str,
-            'unit': entry['unit'],
-            'grocery_category': entry['grocery_category'],
-            'kitchen_staple': entry['kitchen_staple'],
-        })
-
-    items.sort(key=lambda x: (x['grocery_category'], x['name']))
-
-    from itertools import groupby
-    grouped = []
-    for cat, group in groupby(items, key=lambda x: x['grocery_category']):
-        grouped.append((cat, list(group)))
+        result, _ = _build_shopping_list(conn, {rid: 1.0 for rid in selected_ids})
 
     return render_template('shopping_list.html', recipes=recipes,
-                           result=grouped, selected_ids=selected_ids,
-                           selected_recipes=selected_recipes,
+                           result=result['categories'], selected_ids=selected_ids,
+                           selected_recipes=result['recipes'],
                            hide_staples=hide_staples)
 
 
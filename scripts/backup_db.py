@@ -1,48 +1,83 @@
 #!/usr/bin/env python3
 """
-SQLite backup helper. Two modes:
+SQLite backup helper. Modes:
 
-    python3 scripts/backup_db.py daily
+    python3 scripts/backup_db.py daily [--store=files|pages]
         Snapshot tagged "daily". Prunes daily snapshots older than 14 days.
 
-    python3 scripts/backup_db.py pre-edit [--note=<slug>]
-        Snapshot tagged "pre-edit" (called by app.py before each user-initiated
-        edit). Keeps the 50 most recent.
+    python3 scripts/backup_db.py pre-edit [--note=<slug>] [--store=files|pages]
+        Snapshot tagged "pre-edit". Keeps the 50 most recent. app.py imports
+        run_backup() and runs it in-process on a background thread
+        (BackupService); the CLI form is for skill_remote_commit.py and
+        manual use.
 
-Reads DB path and backup directory from env:
-    RECIPE_DB_PATH   absolute path to recipe.db (default: /app/recipe.db inside
-                     the container, ./recipe.db otherwise)
+    python3 scripts/backup_db.py restore <manifest> <out.db>
+        Rebuild a page-store snapshot into a standalone .db file. <manifest>
+        is a manifest name (recipe-daily-...) or a path to its .json.
+
+Reads DB path, backup directory and store from env:
+    RECIPE_DB_PATH   absolute path to recipe.db (default: /app/data/recipe.db
+                     inside the container, ./recipe.db otherwise)
     BACKUP_DIR       absolute path to backup directory. If unset, the script
                      exits 0 silently (so local dev is a no-op).
+    BACKUP_STORE     "files" (default) or "pages"; --store overrides it.
+
+Store "files" writes one full copy per snapshot:
+    $BACKUP_DIR/recipe-<tag>-<YYYYmmddTHHMMSS.ffffffZ>[--<note>].db
 
-Backups are written to:
-    $BACKUP_DIR/recipe-<tag>-<YYYYmmddTHHMMSSZ>[--<note>].db
+The timestamp has microsecond resolution so that snapshots taken within
+the same second (several app workers, or a trailing pre-edit snapshot)
+don't overwrite each other.
+
+Store "pages" is content-addressed: each snapshot is split into SQLite
+pages, every unique page is stored once under its SHA-256, and a small
+manifest lists the page hashes in order:
+    $BACKUP_DIR/pagestore/pages/<h[:2]>/<sha256>
+    $BACKUP_DIR/pagestore/manifests/recipe-<tag>-<ts>[--<note>].json
+Disk use and write I/O then scale with the pages that changed between
+snapshots. The snapshot is taken into a temp file next to the store and
+read back one page at a time, so memory use doesn't grow with the
+database. Pruning drops manifests by the same retention rules and then
+deletes pages no remaining manifest references. Writers and pruners hold an
+flock on pagestore/.lock so a prune never sweeps pages of a snapshot that
+is still being written.
 
 Uses SQLite's online backup API — safe to run while the app is serving.
 """
 from __future__ import annotations
 
 import argparse
+import fcntl
+import hashlib
+import json
 import os
 import sqlite3
 import sys
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 
 DAILY_KEEP_DAYS = 14
 PRE_EDIT_KEEP_COUNT = 50
+STORES = ("files", "pages")
 
 
 def _default_db_path() -> str:
-    if Path("/app/recipe.db").exists():
-        return "/app/recipe.db"
+    for candidate in ("/app/data/recipe.db", "/app/recipe.db"):
+        if Path(candidate).exists():
+            return candidate
     return str(Path(__file__).resolve().parent.parent / "recipe.db")
 
 
-def snapshot(db_path: str, backup_dir: Path, tag: str, note: str | None) -> Path:
-    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+def _snapshot_name(tag: str, note: str | None) -> str:
+    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
     suffix = f"--{note}" if note else ""
-    out = backup_dir / f"recipe-{tag}-{ts}{suffix}.db"
+    return f"recipe-{tag}-{ts}{suffix}"
+
+
+def snapshot(db_path: str, backup_dir: Path, tag: str, note: str | None) -> Path:
+    out = backup_dir / f"{_snapshot_name(tag, note)}.db"
     backup_dir.mkdir(parents=True, exist_ok=True)
     src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
     try:
@@ -57,28 +92,239 @@ def snapshot(db_path: str, backup_dir: Path, tag: str, note: str | None) -> Path
     return out
 
 
-def prune_daily(backup_dir: Path, keep_days: int) -> int:
+def _mtime(path: Path) -> float:
+    # Several app workers may prune the same directory concurrently, so a
+    # file can vanish between glob() and stat().
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return float("inf")
+
+
+def prune_daily(backup_dir: Path, keep_days: int, pattern: str = "recipe-daily-*.db") -> int:
     cutoff = datetime.now(timezone.utc).timestamp() - keep_days * 86400
     removed = 0
-    for f in backup_dir.glob("recipe-daily-*.db"):
-        if f.stat().st_mtime < cutoff:
-            f.unlink()
+    for f in backup_dir.glob(pattern):
+        if _mtime(f) < cutoff:
+            f.unlink(missing_ok=True)
             removed += 1
     return removed
 
 
-def prune_pre_edit(backup_dir: Path, keep_count: int) -> int:
-    files = sorted(backup_dir.glob("recipe-pre-edit-*.db"), key=lambda p: p.stat().st_mtime)
+def prune_pre_edit(backup_dir: Path, keep_count: int, pattern: str = "recipe-pre-edit-*.db") -> int:
+    files = sorted(backup_dir.glob(pattern), key=_mtime)
     excess = files[:-keep_count] if len(files) > keep_count else []
     for f in excess:
-        f.unlink()
+        f.unlink(missing_ok=True)
     return len(excess)
 
 
+# ---------------------------------------------------------------------------
+# Content-addressed page store.
+# ---------------------------------------------------------------------------
+
+def _store_dirs(backup_dir: Path) -> tuple[Path, Path, Path]:
+    root = backup_dir / "pagestore"
+    return root, root / "pages", root / "manifests"
+
+
+@contextmanager
+def _store_lock(root: Path):
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _page_path(pages_dir: Path, digest: str) -> Path:
+    return pages_dir / digest[:2] / digest
+
+
+@contextmanager
+def _consistent_image(db_path: str, scratch_dir: Path):
+    """Path of a transactionally consistent copy of the DB, taken with the
+    online backup API into a temp file in scratch_dir and removed on exit."""
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=scratch_dir)
+    os.close(fd)
+    try:
+        src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            dst = sqlite3.connect(tmp)
+            try:
+                with dst:
+                    src.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+        yield Path(tmp)
+    finally:
+        os.unlink(tmp)
+
+
+def _page_size(header: bytes) -> int:
+    # Page size lives in the header at offset 16 (big-endian; 1 means 65536).
+    page_size = int.from_bytes(header[16:18], "big")
+    if page_size == 1:
+        return 65536
+    if page_size == 0:  # empty database, no pages at all
+        return 4096
+    return page_size
+
+
+def snapshot_pages(db_path: str, backup_dir: Path, tag: str, note: str | None) -> tuple[Path, int]:
+    """Write a page-store snapshot. Returns (manifest path, pages written).
+    Pages are hashed and stored as they are read, one at a time."""
+    root, pages_dir, manifests_dir = _store_dirs(backup_dir)
+    manifests_dir.mkdir(parents=True, exist_ok=True)
+    digests = []
+    whole = hashlib.sha256()
+    size = written = 0
+    with _consistent_image(db_path, root) as image, open(image, "rb") as fh:
+        page_size = _page_size(fh.read(100))
+        fh.seek(0)
+        with _store_lock(root):
+            while page := fh.read(page_size):
+                digest = hashlib.sha256(page).hexdigest()
+                digests.append(digest)
+                whole.update(page)
+                size += len(page)
+                path = _page_path(pages_dir, digest)
+                if path.exists():
+                    continue
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(page)
+                os.replace(tmp, path)
+                written += 1
+            out = manifests_dir / f"{_snapshot_name(tag, note)}.json"
+            tmp = out.with_suffix(".tmp")
+            tmp.write_text(json.dumps({
+                "tag": tag,
+                "note": note,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "page_size": page_size,
+                "size": size,
+                "sha256": whole.hexdigest(),
+                "pages": digests,
+            }))
+            os.replace(tmp, out)
+    return out, written
+
+
+def prune_pages(backup_dir: Path, tag: str) -> tuple[int, int]:
+    """Apply the tag's retention rule to manifests, then delete every page
+    whose reference count across the remaining manifests is zero. Returns
+    (manifests removed, pages removed)."""
+    root, pages_dir, manifests_dir = _store_dirs(backup_dir)
+    if not manifests_dir.exists():
+        return 0, 0
+    with _store_lock(root):
+        if tag == "daily":
+            removed = prune_daily(manifests_dir, DAILY_KEEP_DAYS, "recipe-daily-*.json")
+        else:
+            removed = prune_pre_edit(manifests_dir, PRE_EDIT_KEEP_COUNT, "recipe-pre-edit-*.json")
+        if not removed:
+            return 0, 0
+        refcount: dict[str, int] = {}
+        for m in manifests_dir.glob("*.json"):
+            for digest in json.loads(m.read_text())["pages"]:
+                refcount[digest] = refcount.get(digest, 0) + 1
+        swept = 0
+        for page in pages_dir.glob("*/*"):
+            if page.name not in refcount:
+                page.unlink(missing_ok=True)
+                swept += 1
+    return removed, swept
+
+
+def restore_pages(manifest: Path, out: Path) -> int:
+    """Rebuild a page-store snapshot into `out`, verifying every page hash
+    and the whole-file hash. Returns the number of pages written."""
+    backup_dir = manifest.parent.parent.parent
+    _, pages_dir, _ = _store_dirs(backup_dir)
+    meta = json.loads(manifest.read_text())
+    whole = hashlib.sha256()
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        for digest in meta["pages"]:
+            page = _page_path(pages_dir, digest).read_bytes()
+            if hashlib.sha256(page).hexdigest() != digest:
+                raise RuntimeError(f"page {digest} is corrupt")
+            whole.update(page)
+            fh.write(page)
+    if whole.hexdigest() != meta["sha256"]:
+        tmp.unlink()
+        raise RuntimeError("restored image does not match manifest sha256")
+    os.replace(tmp, out)
+    return len(meta["pages"])
+
+
+def run_backup(db_path: str, backup_dir: Path, tag: str, note: str | None,
+               store: str = "files") -> tuple[Path, int]:
+    """Snapshot + prune for one tag in the given store. Returns (output
+    path, number of snapshots pruned)."""
+    if store == "pages":
+        out, _ = snapshot_pages(db_path, backup_dir, tag, note)
+        pruned, _ = prune_pages(backup_dir, tag)
+        return out, pruned
+    out = snapshot(db_path, backup_dir, tag, note)
+    if tag == "daily":
+        pruned = prune_daily(backup_dir, DAILY_KEEP_DAYS)
+    else:
+        pruned = prune_pre_edit(backup_dir, PRE_EDIT_KEEP_COUNT)
+    return out, pruned
+
+
+def _restore_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="backup_db.py restore")
+    parser.add_argument("manifest", help="manifest name or path to its .json")
+    parser.add_argument("out", help="path of the .db file to write")
+    args = parser.parse_args(argv)
+
+    manifest = Path(args.manifest)
+    if not manifest.exists():
+        backup_dir_env = os.environ.get("BACKUP_DIR")
+        if backup_dir_env:
+            name = args.manifest if args.manifest.endswith(".json") else f"{args.manifest}.json"
+            manifest = _store_dirs(Path(backup_dir_env))[2] / name
+    if not manifest.exists():
+        print(f"backup_db: manifest not found: {args.manifest}", file=sys.stderr)
+        return 1
+    out = Path(args.out)
+    if out.exists():
+        print(f"backup_db: refusing to overwrite {out}", file=sys.stderr)
+        return 1
+
+    try:
+        n = restore_pages(manifest, out)
+    except (OSError, RuntimeError, KeyError, ValueError) as e:
+        print(f"backup_db: restore failed: {e}", file=sys.stderr)
+        return 1
+    conn = sqlite3.connect(f"file:{out}?mode=ro", uri=True)
+    try:
+        check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if check != "ok":
+        print(f"backup_db: integrity_check on {out}: {check}", file=sys.stderr)
+        return 2
+    print(f"backup_db: restored {manifest.name} → {out} ({n} pages)")
+    return 0
+
+
 def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "restore":
+        return _restore_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser()
     parser.add_argument("tag", choices=["daily", "pre-edit"])
     parser.add_argument("--note", default=None, help="optional slug appended to filename")
+    parser.add_argument("--store", choices=STORES,
+                        default=os.environ.get("BACKUP_STORE") or "files")
     args = parser.parse_args()
 
     backup_dir_env = os.environ.get("BACKUP_DIR")
@@ -92,12 +338,7 @@ def main() -> int:
         print(f"backup_db: source DB not found: {db_path}", file=sys.stderr)
         return 1
 
-    out = snapshot(db_path, backup_dir, args.tag, args.note)
-    if args.tag == "daily":
-        pruned = prune_daily(backup_dir, DAILY_KEEP_DAYS)
-    else:
-        pruned = prune_pre_edit(backup_dir, PRE_EDIT_KEEP_COUNT)
-
+    out, pruned = run_backup(db_path, backup_dir, args.tag, args.note, args.store)
     print(f"backup_db: wrote {out.name} (pruned {pruned})")
     return 0
 
@@ -0,0 +1,170 @@
+"""
+Shared plumbing for the bulk loaders (db_ndjson.py import, csv_to_sqlite.py).
+
+A load runs in this order:
+
+    conn = connect(db_path)                 # bulk-import pragma profile
+    create_schema(conn, objects)            # only for a fresh file
+    check_replace(conn, tables, replace)    # refuses to clobber without replace
+    deferred = drop_deferred(conn)          # indexes + triggers, SQL kept
+    empty_tables(conn, tables)
+    insert_chunks(conn, table, cols, rows)  # executemany, one txn per chunk
+    restore_deferred(conn, deferred)        # indexes built once, at the end
+    finish(conn)                            # derived tables, ANALYZE, FK check
+
+Derived tables (ingredient_alias, recipe_fts, recipe_tag, the canonical
+amount columns, recipe_version_diff) are rebuilt by the same migrate()
+functions as migrations 007/008/010/012/015, so a bulk-loaded file holds
+the same derived rows the migrations would have produced. The loaders are
+for files nobody else has open: on failure the target is left half-loaded
+— start again from a fresh file.
+"""
+from __future__ import annotations
+
+import importlib.util
+import sqlite3
+from itertools import islice
+from pathlib import Path
+
+from scripts.sqlite_profiles import apply_pragmas, profile_pragmas
+
+DEFAULT_CHUNK_SIZE = 5000
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+# Migrations whose migrate(conn) rebuilds a derived table from the core
+# tables, with the table/column that tells whether the target uses it.
+REBUILDERS = (
+    ("007_ingredient_alias.py", "ingredient_alias", None),
+    ("008_recipe_fts.py", "recipe_fts", None),
+    ("010_recipe_tag.py", "recipe_tag", None),
+    ("012_ingredient_amount_numeric.py", "recipe_ingredient", "unit_canonical"),
+    ("015_recipe_version_diff.py", "recipe_version_diff", None),
+    ("016_recipe_current_version.py", "recipe", "current_version"),
+)
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    _, pragmas = profile_pragmas("bulk-import")
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def has_column(conn: sqlite3.Connection, table: str,
+               column: str | None = None) -> bool:
+    """Whether table exists (and, given column, has it)."""
+    cols = [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+    return bool(cols) and (column is None or column in cols)
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def schema_objects(conn: sqlite3.Connection) -> list[dict]:
+    """{type, name, sql} for every user-created schema object, in creation
+    order. FTS5 shadow tables (<vtab>_data, _idx, …) are left out: CREATE
+    VIRTUAL TABLE makes them."""
+    virtual = {n for (n,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' "
+        "AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+    )}
+    return [
+        {"type": t, "name": n, "sql": sql}
+        for t, n, sql in conn.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        )
+        if not any(n.startswith(v + "_") for v in virtual)
+    ]
+
+
+def create_schema(conn: sqlite3.Connection, objects: list[dict]) -> None:
+    conn.execute("BEGIN")
+    for obj in objects:
+        conn.execute(obj["sql"])
+    conn.execute("COMMIT")
+
+
+def drop_deferred(conn: sqlite3.Connection) -> list[str]:
+    """Drop every explicit index and trigger and return their SQL. Indexes
+    are cheaper to build once over the loaded rows than to maintain per
+    insert, and the FTS triggers would write a recipe's index row for
+    every recipe loaded. Indexes that back a UNIQUE/PRIMARY KEY
+    constraint (sqlite_autoindex_*) can't be dropped and stay."""
+    rows = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE type IN ('index', 'trigger') AND sql IS NOT NULL ORDER BY rowid"
+    ).fetchall()
+    conn.execute("BEGIN")
+    for kind, name, _ in rows:
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+    conn.execute("COMMIT")
+    return [sql for _, _, sql in rows]
+
+
+def restore_deferred(conn: sqlite3.Connection, statements: list[str]) -> None:
+    conn.execute("BEGIN")
+    for sql in statements:
+        conn.execute(sql)
+    conn.execute("COMMIT")
+
+
+def check_replace(conn: sqlite3.Connection, tables: list[str],
+                  replace: bool) -> None:
+    """Raise ValueError if any of tables has data and replace isn't set.
+    Called before anything is dropped, so a refused load changes nothing."""
+    non_empty = [t for t in tables
+                 if conn.execute(f'SELECT 1 FROM "{t}" LIMIT 1').fetchone()]
+    if non_empty and not replace:
+        raise ValueError(f"target already has data in {non_empty}; "
+                         "pass --replace to overwrite")
+
+
+def empty_tables(conn: sqlite3.Connection, tables: list[str]) -> None:
+    """Delete every row of tables, children first."""
+    conn.execute("BEGIN")
+    for t in reversed(tables):
+        conn.execute(f'DELETE FROM "{t}"')
+    conn.execute("COMMIT")
+
+
+def insert_chunks(conn: sqlite3.Connection, table: str, columns: list[str],
+                  rows, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """INSERT rows (an iterable of sequences matching columns) with
+    executemany, one transaction per chunk_size rows, so memory stays at
+    one chunk however large the source is. Returns the row count."""
+    names = ", ".join(f'"{c}"' for c in columns)
+    marks = ", ".join("?" for _ in columns)
+    sql = f'INSERT INTO "{table}" ({names}) VALUES ({marks})'
+    rows = iter(rows)
+    total = 0
+    while chunk := list(islice(rows, chunk_size)):
+        conn.execute("BEGIN")
+        conn.executemany(sql, chunk)
+        conn.execute("COMMIT")
+        total += len(chunk)
+    return total
+
+
+def _load_rebuilder(filename: str):
+    spec = importlib.util.spec_from_file_location(
+        filename.removesuffix(".py"), MIGRATIONS_DIR / filename
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.migrate
+
+
+def finish(conn: sqlite3.Connection) -> None:
+    """Rebuild the derived tables the target has, refresh planner
+    statistics (as migration 009 does in prod), then check foreign keys
+    (the bulk-import profile loads with them off). Raises ValueError on
+    violations."""
+    for filename, table, column in REBUILDERS:
+        if has_column(conn, table, column):
+            _load_rebuilder(filename)(conn)
+    conn.execute("ANALYZE")
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        raise ValueError(f"{len(violations)} foreign key violation(s), "
+                         f"e.g. {violations[:5]}")
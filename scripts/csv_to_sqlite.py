@@ -1,33 +1,158 @@
+#!/usr/bin/env python3
 """
-Bootstrap script: create a local SQLite database from CSV files in scripts/.
+Bootstrap script: load CSV files into a SQLite database with the migrated
+(production) schema.
 
 Usage:
-1. Place your CSV files (recipe.csv, ingredient.csv, recipe_ingredient.csv) in the scripts/ folder.
-2. Run: python scripts/csv_to_sqlite.py
+    python scripts/csv_to_sqlite.py [db_path] [--schema-from data/recipe.db]
+                                    [--csv-dir scripts/] [--replace]
+                                    [--chunk-size N]
+
+1. Place the CSV files in --csv-dir (default: scripts/): ingredient.csv,
+   recipe.csv, recipe_ingredient.csv and optionally recipe_version.csv.
+   The header row names the columns; columns the table doesn't have are
+   skipped with a warning, missing ones get the schema default. Empty
+   cells load as NULL.
+2. A fresh db_path (default: $SQLITE_DB_PATH or recipe.db) gets its schema
+   from --schema-from, any database that has been through the migrations —
+   e.g. a prod mirror from `make pull-db` / `make pull-ndjson`. Tables,
+   constraints (AUTOINCREMENT, CHECK, NOCASE unique name, foreign keys),
+   views, indexes and triggers are copied as-is. An existing db_path is
+   loaded into its own schema; --replace empties the tables first.
+
+Rows go in through scripts/bulk_load.py: csv.reader streaming (one chunk
+in memory at a time), executemany with one transaction per chunk, the
+bulk-import pragma profile, indexes and triggers created after the load,
+derived tables rebuilt and foreign keys checked at the end.
 """
+from __future__ import annotations
+
+import argparse
+import csv
 import os
 import sqlite3
-import pandas as pd
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from scripts.bulk_load import (  # noqa: E402
+    DEFAULT_CHUNK_SIZE, check_replace, connect, create_schema, drop_deferred,
+    empty_tables, finish, has_column, insert_chunks, restore_deferred,
+    schema_objects, table_columns,
+)
 
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "recipe.db")
 CSV_FOLDER = os.path.join(os.path.dirname(__file__))
 
+# Parents before children, so the deferred FK check has nothing to find.
 TABLES = [
-    ("recipe", "recipe.csv"),
     ("ingredient", "ingredient.csv"),
-    ("recipe_ingredient", "recipe_ingredient.csv")
+    ("recipe", "recipe.csv"),
+    ("recipe_ingredient", "recipe_ingredient.csv"),
+    ("recipe_version", "recipe_version.csv"),
 ]
+OPTIONAL = {"recipe_version"}
+
+
+def _csv_rows(csv_path: Path, target: list[str]):
+    """(columns, row iterator) for the CSV columns the table has."""
+    f = open(csv_path, newline="", encoding="utf-8-sig")
+    reader = csv.reader(f)
+    header = [h.strip() for h in next(reader, [])]
+    keep = [i for i, h in enumerate(header) if h in target]
+    skipped = [h for h in header if h not in target]
+    if skipped:
+        print(f"  ! {csv_path.name}: skipping unknown column(s) {skipped}",
+              file=sys.stderr)
+
+    def rows():
+        with f:
+            for row in reader:
+                yield [row[i] if i < len(row) and row[i] != "" else None
+                       for i in keep]
+
+    return [header[i] for i in keep], rows()
+
+
+def load(db_path: Path, csv_dir: Path, schema_from: Path | None = None,
+         replace: bool = False,
+         chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[str, tuple[int, float]]:
+    """Returns {table: (rows, seconds)}."""
+    sources = [(t, csv_dir / name) for t, name in TABLES
+               if t not in OPTIONAL or (csv_dir / name).exists()]
+    missing = [str(p) for _, p in sources if not p.exists()]
+    if missing:
+        raise ValueError(f"CSV file(s) not found: {missing}")
+
+    conn = connect(db_path)
+    try:
+        if not has_column(conn, "recipe"):
+            if schema_from is None:
+                raise ValueError(f"{db_path} has no schema; pass --schema-from "
+                                 "a migrated database (e.g. data/recipe.db)")
+            src = sqlite3.connect(f"file:{schema_from}?mode=ro", uri=True)
+            objects = schema_objects(src)
+            src.close()
+            create_schema(conn, objects)
+
+        tables = [t for t, _ in sources]
+        check_replace(conn, tables, replace)
+        deferred = drop_deferred(conn)
+        empty_tables(conn, tables)
+
+        stats = {}
+        for table, csv_path in sources:
+            columns, rows = _csv_rows(csv_path, table_columns(conn, table))
+            started = time.monotonic()
+            n = insert_chunks(conn, table, columns, rows, chunk_size)
+            stats[table] = (n, time.monotonic() - started)
+            _report(table, *stats[table])
+
+        started = time.monotonic()
+        restore_deferred(conn, deferred)
+        finish(conn)
+        print(f"  indexes, triggers and derived tables: "
+              f"{time.monotonic() - started:.2f}s")
+    finally:
+        conn.close()
+    return stats
+
+
+def _report(table: str, rows: int, seconds: float) -> None:
+    rate = rows / seconds if seconds > 0 else float("inf")
+    print(f"  {table}: {rows} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("db", nargs="?", default=SQLITE_DB_PATH)
+    parser.add_argument("--schema-from", type=Path)
+    parser.add_argument("--csv-dir", type=Path, default=Path(CSV_FOLDER))
+    parser.add_argument("--replace", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.schema_from and not args.schema_from.exists():
+        print(f"✗ DB not found: {args.schema_from}", file=sys.stderr)
+        return 1
+
+    print(f"Loading {args.csv_dir}/*.csv into {args.db}...")
+    started = time.monotonic()
+    try:
+        stats = load(Path(args.db), args.csv_dir, args.schema_from,
+                     args.replace, args.chunk_size)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"✗ Import failed: {e}", file=sys.stderr)
+        return 1
+
+    total = sum(n for n, _ in stats.values())
+    elapsed = time.monotonic() - started
+    print(f"✓ {total} rows in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed else 0:,.0f} rows/s overall). "
+          "Local SQLite database is ready.")
+    return 0
 
-def import_csv_to_sqlite(table_name, csv_file, conn):
-    csv_path = os.path.join(CSV_FOLDER, csv_file)
-    print(f"Importing {csv_path} into table '{table_name}'...")
-    df = pd.read_csv(csv_path)
-    df.to_sql(table_name, conn, if_exists='replace', index=False)
-    print(f"{table_name}: {len(df)} rows imported.")
 
 if __name__ == "__main__":
-    conn = sqlite3.connect(SQLITE_DB_PATH)
-    for table_name, csv_file in TABLES:
-        import_csv_to_sqlite(table_name, csv_file, conn)
-    conn.close()
-    print("Data import complete. Local SQLite database is ready.")
+    sys.exit(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Stream the recipe database to and from NDJSON with constant memory.
+
+Usage:
+    python3 scripts/db_ndjson.py export [db] [out.ndjson|-] [--skip-history]
+    python3 scripts/db_ndjson.py import <in.ndjson|-> <db> [--replace]
+                                        [--chunk-size=N]
+
+    # Local mirror straight from prod, without copying the DB file:
+    ssh minvps "cd /opt/recipe-db && python3 scripts/db_ndjson.py export data/recipe.db -" \\
+        | python3 scripts/db_ndjson.py import - data/recipe.mirror.db
+
+Format — one JSON object per line:
+    {"format": "recipe-db-ndjson", "version": 1, "schema": [...DDL...],
+     "tables": {"recipe": ["id", "title", ...], ...}}
+    {"t": "ingredient", "r": [1, "gullök", ...]}        (one line per row)
+    ...
+
+Rows are written parent tables first (ingredient, recipe, recipe_ingredient,
+recipe_version, then any other table) from a single read transaction, so
+the export is a consistent snapshot even while the app is writing.
+Derived tables (ingredient_alias, recipe_tag, recipe_fts, recipe_version_diff)
+are not exported; import rebuilds them with the same code as migrations
+007/008/010/012/015.
+
+Import into a new file creates the schema from the header. Import into an
+existing database requires --replace, which empties the tables present in
+the export first (an export made with --skip-history leaves
+recipe_version). Loading goes through scripts/bulk_load.py: executemany,
+one transaction per --chunk-size rows (default 5000), the bulk-import
+pragma profile, indexes and triggers rebuilt after the load, foreign keys
+checked once at the end.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import sqlite3
+import sys
+import time
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from scripts.bulk_load import (  # noqa: E402
+    DEFAULT_CHUNK_SIZE, check_replace, connect, create_schema, drop_deferred,
+    empty_tables, finish, has_column, insert_chunks, restore_deferred,
+    schema_objects, table_columns,
+)
+
+FORMAT, VERSION = "recipe-db-ndjson", 1
+PARENT_FIRST = ("ingredient", "recipe", "recipe_ingredient", "recipe_version")
+DERIVED = {"ingredient_alias", "recipe_tag", "recipe_fts", "recipe_version_diff",
+           "sqlite_sequence"}
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"$b64": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and "$b64" in value:
+        return base64.b64decode(value["$b64"])
+    return value
+
+
+def _is_shadow(name: str, virtual: set[str]) -> bool:
+    """FTS5 keeps its index in <vtab>_data, _idx, _content, _docsize,
+    _config — created by CREATE VIRTUAL TABLE, never by hand."""
+    return any(name.startswith(v + "_") for v in virtual)
+
+
+def _exported_tables(conn: sqlite3.Connection) -> list[str]:
+    virtual = {n for (n,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' "
+        "AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+    )}
+    names = [n for (n,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
+    ) if n not in DERIVED and n not in virtual and not _is_shadow(n, virtual)
+        and not n.startswith("sqlite_")]
+    return ([n for n in PARENT_FIRST if n in names]
+            + [n for n in names if n not in PARENT_FIRST])
+
+
+def export(db_path: Path, out, skip_history: bool = False) -> dict[str, int]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True,
+                           isolation_level=None)
+    conn.execute("BEGIN")  # one snapshot for every table
+    tables = _exported_tables(conn)
+    if skip_history:
+        tables = [t for t in tables if t != "recipe_version"]
+    columns = {
+        t: [r[1] for r in conn.execute(f'PRAGMA table_info("{t}")')]
+        for t in tables
+    }
+    header = {"format": FORMAT, "version": VERSION,
+              "schema": schema_objects(conn), "tables": columns}
+    out.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+    without_rowid = {n for (n,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' "
+        "AND sql LIKE '%WITHOUT ROWID%'"
+    )}
+    counts = {}
+    for t in tables:
+        n = 0
+        cols = ", ".join(f'"{c}"' for c in columns[t])
+        # WITHOUT ROWID tables (cache_epoch) scan in primary-key order anyway.
+        order = "" if t in without_rowid else " ORDER BY rowid"
+        for row in conn.execute(f'SELECT {cols} FROM "{t}"{order}'):
+            out.write(json.dumps({"t": t, "r": [_encode(v) for v in row]},
+                                 ensure_ascii=False) + "\n")
+            n += 1
+        counts[t] = n
+    conn.execute("COMMIT")
+    conn.close()
+    return counts
+
+
+def _rows(src, tables: dict[str, list[str]]):
+    for line in src:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if item["t"] not in tables:
+            raise ValueError(f"row for table {item['t']!r} not in header")
+        yield item["t"], item["r"]
+
+
+def import_(src, db_path: Path, replace: bool = False,
+            chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[str, int]:
+    header = json.loads(src.readline() or "null")
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise ValueError("not a recipe-db NDJSON export (bad header line)")
+    if header.get("version") != VERSION:
+        raise ValueError(f"unsupported export version {header.get('version')}")
+    tables: dict[str, list[str]] = header["tables"]
+
+    conn = connect(db_path)
+    try:
+        if not has_column(conn, "recipe"):
+            create_schema(conn, header["schema"])
+        present = [t for t in tables if has_column(conn, t)]
+        check_replace(conn, present, replace)
+        deferred = drop_deferred(conn)
+        empty_tables(conn, present)
+
+        counts = {t: 0 for t in tables}
+        for table, group in groupby(_rows(src, tables), key=itemgetter(0)):
+            # Columns the target doesn't have (older schema) are dropped.
+            target = set(table_columns(conn, table))
+            keep = [i for i, c in enumerate(tables[table]) if c in target]
+            counts[table] += insert_chunks(
+                conn, table, [tables[table][i] for i in keep],
+                ([_decode(row[i]) for i in keep] for _, row in group),
+                chunk_size,
+            )
+
+        restore_deferred(conn, deferred)
+        finish(conn)
+    finally:
+        conn.close()
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_exp = sub.add_parser("export")
+    p_exp.add_argument("db", nargs="?", default="data/recipe.db")
+    p_exp.add_argument("out", nargs="?", default="-")
+    p_exp.add_argument("--skip-history", action="store_true",
+                       help="leave out recipe_version")
+    p_imp = sub.add_parser("import")
+    p_imp.add_argument("src")
+    p_imp.add_argument("db")
+    p_imp.add_argument("--replace", action="store_true")
+    p_imp.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    if args.cmd == "export":
+        db_path = Path(args.db)
+        if not db_path.exists():
+            print(f"✗ DB not found: {db_path}", file=sys.stderr)
+            return 1
+        if args.out == "-":
+            counts = export(db_path, sys.stdout, args.skip_history)
+        else:
+            with open(args.out, "w", encoding="utf-8") as out:
+                counts = export(db_path, out, args.skip_history)
+        verb = "exported"
+    else:
+        try:
+            if args.src == "-":
+                counts = import_(sys.stdin, Path(args.db), args.replace,
+                                 args.chunk_size)
+            else:
+                with open(args.src, encoding="utf-8") as src:
+                    counts = import_(src, Path(args.db), args.replace,
+                                     args.chunk_size)
+        except (ValueError, sqlite3.Error) as e:
+            print(f"✗ Import failed: {e}", file=sys.stderr)
+            return 1
+        verb = "imported"
+
+    elapsed = time.monotonic() - started
+    summary = ", ".join(f"{t}={n}" for t, n in counts.items())
+    print(f"✓ {verb} {sum(counts.values())} row(s) in {elapsed:.1f}s ({summary})",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
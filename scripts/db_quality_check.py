@@ -18,11 +18,20 @@ Exit codes:
 from __future__ import annotations
 
 import argparse
+import json
 import sqlite3
 import sys
+import zlib
 from dataclasses import dataclass
+from itertools import groupby
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from scripts.version_store import materialize  # noqa: E402
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                             "abcdefghijklmnopqrstuvwxyz")
+
 # Image URLs to consider valid (in addition to disk existence and http(s)).
 EMPTY_OR_NULL = ("", None)
 
@@ -128,6 +137,176 @@ def expect_unique_ingredient_names(conn: sqlite3.Connection) -> Expectation:
     )
 
 
+def expect_alias_index_in_sync(conn: sqlite3.Connection) -> Expectation:
+    """ingredient_alias (migration 007) is derived from ingredient.aliases
+    and maintained by app.py. Hand edits via /sql can make them drift — rerun
+    007 to rebuild if this fails."""
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='ingredient_alias'"
+    ).fetchone()
+    if not has_table:
+        return Expectation("ingredient_alias_matches_aliases_json",
+                           [(None, "ingredient_alias missing — run migration 007")])
+    indexed: dict[int, set[str]] = {}
+    for key, ing_id in conn.execute(
+        "SELECT alias_key, ingredient_id FROM ingredient_alias"
+    ).fetchall():
+        indexed.setdefault(ing_id, set()).add(key)
+    bad = []
+    for ing_id, name, raw in conn.execute(
+        "SELECT id, name, aliases FROM ingredient"
+    ).fetchall():
+        try:
+            aliases = json.loads(raw or "[]")
+        except (TypeError, ValueError):
+            aliases = []
+        expected = {a.strip().lower() for a in aliases
+                    if isinstance(a, str) and a.strip()}
+        if indexed.get(ing_id, set()) != expected:
+            bad.append((ing_id, f"name={name!r} json={sorted(expected)} "
+                                f"index={sorted(indexed.get(ing_id, set()))}"))
+    return Expectation("ingredient_alias_matches_aliases_json", bad)
+
+
+def expect_tag_index_in_sync(conn: sqlite3.Connection) -> Expectation:
+    """recipe_tag (migration 010) is derived from recipe.tags and maintained
+    by app.py. Hand edits via /sql can make them drift — rerun 010 to rebuild
+    if this fails."""
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='recipe_tag'"
+    ).fetchone()
+    if not has_table:
+        return Expectation("recipe_tag_matches_tags",
+                           [(None, "recipe_tag missing — run migration 010")])
+    indexed: dict[int, set[str]] = {}
+    for rid, tag in conn.execute(
+        "SELECT recipe_id, tag FROM recipe_tag"
+    ).fetchall():
+        indexed.setdefault(rid, set()).add(tag)
+    bad = []
+    for rid, raw in conn.execute("SELECT id, tags FROM recipe").fetchall():
+        expected, seen = set(), set()
+        for t in (raw or "").split(","):
+            t = t.strip()
+            key = t.translate(_ASCII_LOWER)  # NOCASE folds ASCII only
+            if t and key not in seen:
+                seen.add(key)
+                expected.add(t)
+        if indexed.get(rid, set()) != expected:
+            bad.append((rid, f"tags={raw!r} index={sorted(indexed.get(rid, set()))}"))
+    return Expectation("recipe_tag_matches_tags", bad)
+
+
+def expect_fts_in_sync(conn: sqlite3.Connection) -> Expectation:
+    """recipe_fts (migration 008) is maintained by triggers, and its
+    ingredients column by the app's writers. Dropped triggers or links
+    edited via /sql can make it drift — rerun 008 to rebuild if this
+    fails."""
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='recipe_fts'"
+    ).fetchone()
+    if not has_table:
+        return Expectation("recipe_fts_matches_recipes",
+                           [(None, "recipe_fts missing — run migration 008")])
+    rows = conn.execute("""
+        SELECT r.id, f.rowid IS NULL,
+               f.title IS NOT r.title OR f.description IS NOT r.description
+               OR f.instructions IS NOT r.instructions OR f.notes IS NOT r.notes
+               OR f.tags IS NOT r.tags,
+               f.ingredients IS NOT (
+                   SELECT coalesce(group_concat(name, ', '), '') FROM (
+                       SELECT i.name FROM recipe_ingredient ri
+                       JOIN ingredient i ON i.id = ri.ingredient_id
+                       WHERE ri.recipe_id = r.id ORDER BY ri.id))
+        FROM recipe r LEFT JOIN recipe_fts f ON f.rowid = r.id
+    """).fetchall()
+    bad = []
+    for rid, missing, text_stale, ings_stale in rows:
+        if missing:
+            bad.append((rid, "no recipe_fts row"))
+        elif text_stale or ings_stale:
+            bad.append((rid, "stale " + ("text" if text_stale else "ingredients")))
+    extra = conn.execute(
+        "SELECT rowid FROM recipe_fts WHERE rowid NOT IN (SELECT id FROM recipe)"
+    ).fetchall()
+    bad.extend((r[0], "recipe_fts row for deleted recipe") for r in extra)
+    return Expectation("recipe_fts_matches_recipes", bad)
+
+
+def expect_amounts_parsed(conn: sqlite3.Connection) -> Expectation:
+    """recipe_ingredient.unit_canonical (migration 012) is written by app.py
+    next to every amount. Rows written around the app (/sql, the legacy
+    skill_remote_commit.py path) lack it and drop out of shopping-list
+    totals — rerun 012 to backfill if this fails."""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe_ingredient)")}
+    if "unit_canonical" not in cols:
+        return Expectation("recipe_ingredient_amounts_parsed",
+                           [(None, "unit_canonical missing — run migration 012")])
+    rows = conn.execute(
+        "SELECT id, recipe_id, amount, unit FROM recipe_ingredient "
+        "WHERE unit_canonical IS NULL"
+    ).fetchall()
+    return Expectation(
+        "recipe_ingredient_amounts_parsed",
+        [(r[0], f"recipe_id={r[1]} amount={r[2]!r} unit={r[3]!r}") for r in rows],
+    )
+
+
+def expect_history_materializes(conn: sqlite3.Connection) -> Expectation:
+    """Every delta-encoded recipe_version row (migration 013) must resolve
+    from a keyframe to a snapshot whose ingredients_json parses, and every
+    compressed value (migration 014) must decompress. Rows written around
+    the app are fine as long as they are full rows."""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe_version)")}
+    if "delta_json" not in cols:
+        return Expectation("recipe_version_history_materializes", [])
+    zdicts = {}
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                    "AND name = 'recipe_version_zdict'").fetchone():
+        zdicts = dict(conn.execute("SELECT id, zdict FROM recipe_version_zdict"))
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            "SELECT * FROM recipe_version ORDER BY recipe_id, version_number"
+        ).fetchall()
+    finally:
+        conn.row_factory = None
+    failed = []
+    for rid, chain in groupby(rows, key=lambda r: r["recipe_id"]):
+        try:
+            versions = materialize(chain, zdicts=zdicts)
+        except (ValueError, TypeError, IndexError, zlib.error) as e:
+            failed.append((rid, f"history does not materialize: {e}"))
+            continue
+        for v, row in versions.items():
+            try:
+                json.loads(row["ingredients_json"] or "[]")
+            except ValueError:
+                failed.append((rid, f"v{v}: ingredients_json is not JSON"))
+    return Expectation("recipe_version_history_materializes", failed)
+
+
+def expect_current_version_in_sync(conn: sqlite3.Connection) -> Expectation:
+    """recipe.current_version (migration 016) must equal the recipe's latest
+    recipe_version, or the next edit's compare-and-swap reports a conflict
+    (too high) or collides with an existing version (too low). Edits via /sql
+    don't maintain it — rerun 016 to backfill if this fails."""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe)")}
+    if "current_version" not in cols:
+        return Expectation("recipe_current_version_in_sync",
+                           [(None, "current_version missing — run migration 016")])
+    rows = conn.execute("""
+        SELECT r.id, r.current_version, MAX(v.version_number)
+        FROM recipe r LEFT JOIN recipe_version v ON v.recipe_id = r.id
+        GROUP BY r.id
+        HAVING r.current_version IS NOT COALESCE(MAX(v.version_number), 0)
+    """).fetchall()
+    return Expectation(
+        "recipe_current_version_in_sync",
+        [(r[0], f"current_version={r[1]} latest version={r[2]}") for r in rows],
+    )
+
+
 ALL_EXPECTATIONS = [
     expect_no_blank_recipe_titles,
     expect_no_orphan_recipe_ingredient,
@@ -135,6 +314,12 @@ ALL_EXPECTATIONS = [
     expect_version_numbers_contiguous,
     expect_kitchen_staple_is_bool,
     expect_unique_ingredient_names,
+    expect_alias_index_in_sync,
+    expect_fts_in_sync,
+    expect_tag_index_in_sync,
+    expect_amounts_parsed,
+    expect_history_materializes,
+    expect_current_version_in_sync,
     # image_urls_resolve handled separately because it needs uploads_dir.
 ]
 
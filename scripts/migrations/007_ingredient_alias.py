@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Migration 007 — normaliserat alias-index för ingredienskatalogen.
+
+Bakgrund: app.py::_resolve_ingredient_id föll tillbaka på en full scan av
+ingredient + json.loads av varje rads aliases-array så fort ett namn inte
+träffade `name = :name COLLATE NOCASE`. apply_recipe_edit anropar resolvern
+en gång per ingrediensrad, så en edit med 20 rader gav 20 katalog-scans.
+
+Ny tabell:
+  ingredient_alias
+    alias_key      TEXT NOT NULL   -- alias.strip().lower() (Python-casefold,
+                                      så å/ä/ö viks korrekt — SQLite NOCASE
+                                      viker bara ASCII)
+    ingredient_id  INTEGER NOT NULL REFERENCES ingredient(id) ON DELETE CASCADE
+    PRIMARY KEY (alias_key, ingredient_id)   -- WITHOUT ROWID
+
+ingredient.aliases (JSON-array) är fortfarande källan-till-sanning och det
+som visas i /ingredient_library. ingredient_alias är ett härlett index som
+app.py håller i synk vid varje katalogskrivning. Om samma alias råkar ligga
+på flera ingredienser vinner lägsta id — samma svar som den gamla scannen
+(som gick i rowid-ordning).
+
+Idempotent: tabellen skapas om den saknas och indexet byggs alltid om från
+ingredient.aliases, så scriptet kan även köras för att reparera ett index
+som glidit isär (t.ex. efter handredigering via /sql).
+
+Använd som: python scripts/migrations/007_ingredient_alias.py [db_path]
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+
+def alias_keys(raw_aliases: str | None) -> set[str]:
+    """Normalised lookup keys for one ingredient's aliases JSON. Mirrors
+    app.py::_alias_keys — invalid JSON and blank entries are skipped."""
+    try:
+        aliases = json.loads(raw_aliases or "[]")
+    except (TypeError, ValueError):
+        return set()
+    if not isinstance(aliases, list):
+        return set()
+    return {a.strip().lower() for a in aliases if isinstance(a, str) and a.strip()}
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    conn.execute("BEGIN")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingredient_alias (
+            alias_key TEXT NOT NULL CHECK (length(alias_key) > 0),
+            ingredient_id INTEGER NOT NULL
+                REFERENCES ingredient(id) ON DELETE CASCADE,
+            PRIMARY KEY (alias_key, ingredient_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingredient_alias_ingredient "
+        "ON ingredient_alias(ingredient_id)"
+    )
+    conn.execute("DELETE FROM ingredient_alias")
+    rows = conn.execute("SELECT id, aliases FROM ingredient").fetchall()
+    pairs = [(key, ing_id) for ing_id, raw in rows for key in alias_keys(raw)]
+    conn.executemany(
+        "INSERT INTO ingredient_alias (alias_key, ingredient_id) VALUES (?, ?)",
+        pairs,
+    )
+    conn.execute("COMMIT")
+    return len(pairs)
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = ON")
+
+    try:
+        written = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    # Verifiera: varje alias i JSON ska gå att slå upp via indexet.
+    missing = []
+    for ing_id, name, raw in conn.execute(
+        "SELECT id, name, aliases FROM ingredient"
+    ).fetchall():
+        for key in alias_keys(raw):
+            hit = conn.execute(
+                "SELECT 1 FROM ingredient_alias "
+                "WHERE alias_key = ? AND ingredient_id = ?",
+                (key, ing_id),
+            ).fetchone()
+            if not hit:
+                missing.append((ing_id, name, key))
+    if missing:
+        print(f"✗ {len(missing)} alias saknas i indexet: {missing[:10]}", file=sys.stderr)
+        return 2
+
+    print(f"✓ ingredient_alias byggt: {written} alias-rad(er).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Migration 008 — fulltextsök (FTS5) över recept och deras ingredienser.
+
+Bakgrund: /api/recipe/search gjorde `LOWER(title) LIKE LOWER('%q%')`, en full
+scan som bara tittade på titeln, och startsidan saknade textsök helt.
+
+Ny virtuell tabell:
+  recipe_fts  (FTS5, rowid = recipe.id)
+    title, description, instructions, notes, tags
+    ingredients   -- ingrediensnamnen för receptet, i recipe_ingredient-ordning
+
+Tokenizer `unicode61 remove_diacritics 0`: å/ä/ö är egna bokstäver i svenskan
+(kål ≠ kal) men versaler viks fortfarande även utanför ASCII. prefix='2 3'
+ger prefixindex så att sök-medan-du-skriver ("kyck*") inte scannar hela
+termlistan.
+
+recipe_fts hålls i synk med triggers för recept- och ingrediensraderna, så
+de skrivvägarna (app.py, /sql, ingredient_library-byte av namn,
+handredigering i sqlite3) täcks:
+  recipe            AFTER INSERT / UPDATE (bara om en sökbar kolumn ändrats) / DELETE
+  ingredient        AFTER UPDATE OF name → räkna om alla recept som använder den
+
+Kolumnen `ingredients` räknas däremot om en gång per skrivning av den som
+ändrar recipe_ingredient (app.py: new_recipe och apply_recipe_edit,
+skill_remote_commit.py) med samma INGREDIENTS_SQL som här. Tidigare fanns
+triggers per länkrad (recipe_fts_link_*), men då skrevs FTS-raden om en gång
+per ändrad länk medan skrivlåset hölls; de tas bort av migrate(). Ändringar
+av recipe_ingredient via /sql eller sqlite3 syns inte i sökindexet förrän
+migrationen körs igen (db_quality_check flaggar glappet).
+
+Idempotent: tabell och triggers skapas om (DROP IF EXISTS + CREATE) och
+indexet byggs alltid om från recipe/recipe_ingredient, så scriptet kan även
+köras för att reparera ett index som glidit isär.
+
+Använd som: python scripts/migrations/008_recipe_fts.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+COLUMNS = ("title", "description", "instructions", "notes", "tags")
+
+# Ingrediensnamnen för receptet med rowid `{recipe_id}` som en textsträng.
+INGREDIENTS_SQL = """(
+    SELECT coalesce(group_concat(name, ', '), '') FROM (
+        SELECT i.name FROM recipe_ingredient ri
+        JOIN ingredient i ON i.id = ri.ingredient_id
+        WHERE ri.recipe_id = {recipe_id}
+        ORDER BY ri.id
+    )
+)"""
+
+
+def _refresh_ingredients(where: str) -> str:
+    return (
+        "UPDATE recipe_fts SET ingredients = "
+        + INGREDIENTS_SQL.format(recipe_id="recipe_fts.rowid")
+        + f" WHERE {where};"
+    )
+
+
+TRIGGERS = {
+    "recipe_fts_recipe_ai": f"""
+        AFTER INSERT ON recipe BEGIN
+            INSERT INTO recipe_fts (rowid, {', '.join(COLUMNS)}, ingredients)
+            VALUES (new.id, {', '.join('new.' + c for c in COLUMNS)},
+                    {INGREDIENTS_SQL.format(recipe_id='new.id')});
+        END""",
+    "recipe_fts_recipe_au": f"""
+        AFTER UPDATE ON recipe
+        WHEN {' OR '.join(f'old.{c} IS NOT new.{c}' for c in ('id',) + COLUMNS)}
+        BEGIN
+            DELETE FROM recipe_fts WHERE rowid = old.id;
+            INSERT INTO recipe_fts (rowid, {', '.join(COLUMNS)}, ingredients)
+            VALUES (new.id, {', '.join('new.' + c for c in COLUMNS)},
+                    {INGREDIENTS_SQL.format(recipe_id='new.id')});
+        END""",
+    "recipe_fts_recipe_ad": """
+        AFTER DELETE ON recipe BEGIN
+            DELETE FROM recipe_fts WHERE rowid = old.id;
+        END""",
+    "recipe_fts_ingredient_au": f"""
+        AFTER UPDATE OF name ON ingredient
+        WHEN old.name IS NOT new.name
+        BEGIN
+            {_refresh_ingredients(
+                'rowid IN (SELECT recipe_id FROM recipe_ingredient '
+                'WHERE ingredient_id = new.id)'
+            )}
+        END""",
+}
+
+
+# Per-link triggers from the first version of this migration.
+DROPPED_TRIGGERS = ("recipe_fts_link_ai", "recipe_fts_link_ad", "recipe_fts_link_au")
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    conn.execute("BEGIN")
+    for name in (*TRIGGERS, *DROPPED_TRIGGERS):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE IF EXISTS recipe_fts")
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE recipe_fts USING fts5(
+            {', '.join(COLUMNS)}, ingredients,
+            tokenize = 'unicode61 remove_diacritics 0',
+            prefix = '2 3'
+        )
+    """)
+    for name, body in TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+    conn.execute(f"""
+        INSERT INTO recipe_fts (rowid, {', '.join(COLUMNS)}, ingredients)
+        SELECT r.id, {', '.join('r.' + c for c in COLUMNS)},
+               {INGREDIENTS_SQL.format(recipe_id='r.id')}
+        FROM recipe r
+    """)
+    conn.execute("INSERT INTO recipe_fts (recipe_fts) VALUES ('optimize')")
+    conn.execute("COMMIT")
+    return conn.execute("SELECT count(*) FROM recipe_fts").fetchone()[0]
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = ON")
+
+    try:
+        written = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    # Verifiera: en FTS-rad per recept.
+    recipes = conn.execute("SELECT count(*) FROM recipe").fetchone()[0]
+    if written != recipes:
+        print(f"✗ recipe_fts har {written} rad(er), recipe har {recipes}",
+              file=sys.stderr)
+        return 2
+
+    print(f"✓ recipe_fts byggt: {written} recept indexerade.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
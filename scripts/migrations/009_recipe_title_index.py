@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration 009 — index för keyset-paginering på (title, id).
+
+Bakgrund: index() och /api/recipe/search (utan q) körde
+`SELECT * FROM recipe ORDER BY title` och renderade/serialiserade hela
+tabellen i ett svep — sortering i en temp-B-tree och minne proportionellt mot
+antalet recept.
+
+Nu paginerar båda med en cursor på (title, id):
+    WHERE (title, id) > (:after_title, :after_id) ORDER BY title, id LIMIT n
+Nytt index:
+  idx_recipe_title_id ON recipe(title, id)
+så att varje sida blir en indexsökning + n steg, oavsett hur långt in i
+listan man är. id är tie-breaker för recept med samma titel.
+
+Idempotent: CREATE INDEX IF NOT EXISTS.
+
+Använd som: python scripts/migrations/009_recipe_title_index.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    conn.execute("BEGIN")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recipe_title_id ON recipe(title, id)"
+    )
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE recipe")
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+
+    try:
+        migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    # Verifiera: sidfrågan ska gå via indexet, utan temp-B-tree för ORDER BY.
+    plan = " | ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id, title FROM recipe "
+        "WHERE (title, id) > ('', 0) ORDER BY title, id LIMIT 50"
+    ).fetchall())
+    if "idx_recipe_title_id" not in plan or "TEMP B-TREE" in plan:
+        print(f"✗ Sidfrågan använder inte indexet: {plan}", file=sys.stderr)
+        return 2
+
+    print("✓ idx_recipe_title_id skapat.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
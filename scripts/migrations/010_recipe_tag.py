@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Migration 010 — normaliserad taggtabell.
+
+Bakgrund: taggar ligger som kommaseparerad text i recipe.tags.
+_category_options läste varje receptrad och splittade strängarna i Python vid
+varje rendering av redigeringsformuläret, och taggfiltrering gick inte att
+göra utan full scan.
+
+Ny tabell:
+  recipe_tag
+    recipe_id  INTEGER NOT NULL REFERENCES recipe(id) ON DELETE CASCADE
+    tag        TEXT NOT NULL COLLATE NOCASE   -- trimmad, som den skrevs
+    PRIMARY KEY (recipe_id, tag)              -- WITHOUT ROWID
+  idx_recipe_tag_tag ON recipe_tag(tag, recipe_id)   -- filtrering per tagg
+
+recipe.tags är fortfarande källan-till-sanning (det som visas, redigeras och
+versioneras i recipe_version). recipe_tag är ett härlett index som app.py
+håller i synk i apply_recipe_edit och new_recipe. Samma tagg två gånger i ett
+recept (även med olika versaler) blir en rad; första stavningen vinner.
+
+Idempotent: tabellen skapas om den saknas och indexet byggs alltid om från
+recipe.tags, så scriptet kan även köras för att reparera ett index som glidit
+isär (t.ex. efter handredigering via /sql).
+
+Använd som: python scripts/migrations/010_recipe_tag.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+
+# SQLite NOCASE folds ASCII only.
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                             "abcdefghijklmnopqrstuvwxyz")
+
+
+def split_tags(raw: str | None) -> list[str]:
+    """Tags in a recipe.tags string, trimmed, blanks dropped, first spelling
+    of each NOCASE-equal tag kept. Mirrors app.py::_split_tags."""
+    out, seen = [], set()
+    for t in (raw or "").split(","):
+        t = t.strip()
+        key = t.translate(_ASCII_LOWER)
+        if t and key not in seen:
+            seen.add(key)
+            out.append(t)
+    return out
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    conn.execute("BEGIN")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recipe_tag (
+            recipe_id INTEGER NOT NULL
+                REFERENCES recipe(id) ON DELETE CASCADE,
+            tag TEXT NOT NULL COLLATE NOCASE CHECK (length(tag) > 0),
+            PRIMARY KEY (recipe_id, tag)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recipe_tag_tag "
+        "ON recipe_tag(tag, recipe_id)"
+    )
+    conn.execute("DELETE FROM recipe_tag")
+    rows = conn.execute("SELECT id, tags FROM recipe").fetchall()
+    pairs = [(rid, tag) for rid, raw in rows for tag in split_tags(raw)]
+    conn.executemany(
+        "INSERT INTO recipe_tag (recipe_id, tag) VALUES (?, ?)", pairs
+    )
+    conn.execute("COMMIT")
+    return len(pairs)
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = ON")
+
+    try:
+        written = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    # Verifiera: varje tagg i recipe.tags ska finnas i recipe_tag.
+    missing = []
+    for rid, raw in conn.execute("SELECT id, tags FROM recipe").fetchall():
+        for tag in split_tags(raw):
+            hit = conn.execute(
+                "SELECT 1 FROM recipe_tag WHERE recipe_id = ? AND tag = ?",
+                (rid, tag),
+            ).fetchone()
+            if not hit:
+                missing.append((rid, tag))
+    if missing:
+        print(f"✗ {len(missing)} tagg(ar) saknas i recipe_tag: {missing[:10]}",
+              file=sys.stderr)
+        return 2
+
+    print(f"✓ recipe_tag byggt: {written} tagg-rad(er).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Migration 011 — skrivräknare för processlokala cachar.
+
+Bakgrund: _category_options körde två SELECT DISTINCT-scans över recipe plus
+en läsning av alla taggar vid varje GET av redigeringsformuläret. Listorna
+ändras bara när ett recept skapas, raderas eller får nytt kök/typ/taggar, så
+app.py cachar dem nu. Gunicorn kör flera workers med var sin cache, så
+ogiltigförklaringen måste gå via databasen.
+
+PRAGMA data_version räcker inte: värdet är per anslutning och ändras inte av
+commits på samma anslutning, så med en connection-pool ser en worker inte
+alltid sina egna skrivningar.
+
+Ny tabell:
+  cache_epoch
+    name   TEXT PRIMARY KEY   -- vilken cache
+    epoch  INTEGER NOT NULL   -- räknas upp vid varje relevant skrivning
+  (WITHOUT ROWID)
+
+Rad 'recipe_categories' räknas upp av triggers på recipe:
+  AFTER INSERT, AFTER DELETE, AFTER UPDATE OF kitchen, type, tags (bara om
+  värdet faktiskt ändrats).
+Rad 'ingredient_catalog' räknas upp av triggers på ingredient:
+  AFTER DELETE, AFTER UPDATE OF name, grocery_category, default_unit,
+  kitchen_staple (bara om värdet faktiskt ändrats). Ingår i shoppinglistans
+  cachenyckel, så namn, kategori och basvaror från ingredient_library syns
+  direkt. Nya ingredienser räknar inte upp den: de används först när ett
+  recept ändras, och då ändras receptets current_version.
+Triggers i stället för anrop i app.py så att även /sql och handredigering
+ogiltigförklarar cacharna.
+
+Idempotent: tabell och rader skapas om de saknas; triggers återskapas.
+
+Använd som: python scripts/migrations/011_cache_epoch.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+EPOCHS = ("recipe_categories", "ingredient_catalog")
+
+
+def _bump(name: str) -> str:
+    return f"UPDATE cache_epoch SET epoch = epoch + 1 WHERE name = '{name}';"
+
+
+BUMP = _bump("recipe_categories")
+BUMP_CATALOG = _bump("ingredient_catalog")
+CATALOG_COLUMNS = ("name", "grocery_category", "default_unit", "kitchen_staple")
+
+TRIGGERS = {
+    "cache_epoch_recipe_ai": f"AFTER INSERT ON recipe BEGIN {BUMP} END",
+    "cache_epoch_recipe_ad": f"AFTER DELETE ON recipe BEGIN {BUMP} END",
+    "cache_epoch_recipe_au": f"""
+        AFTER UPDATE OF kitchen, type, tags ON recipe
+        WHEN old.kitchen IS NOT new.kitchen OR old.type IS NOT new.type
+             OR old.tags IS NOT new.tags
+        BEGIN {BUMP} END""",
+    "cache_epoch_ingredient_ad":
+        f"AFTER DELETE ON ingredient BEGIN {BUMP_CATALOG} END",
+    "cache_epoch_ingredient_au": f"""
+        AFTER UPDATE OF {', '.join(CATALOG_COLUMNS)} ON ingredient
+        WHEN {' OR '.join(f'old.{c} IS NOT new.{c}' for c in CATALOG_COLUMNS)}
+        BEGIN {BUMP_CATALOG} END""",
+}
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    conn.execute("BEGIN")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache_epoch (
+            name TEXT PRIMARY KEY,
+            epoch INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO cache_epoch (name, epoch) VALUES (?, 0)",
+        [(name,) for name in EPOCHS],
+    )
+    for name, body in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+    conn.execute("COMMIT")
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+
+    try:
+        migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    epochs = dict(conn.execute("SELECT name, epoch FROM cache_epoch"))
+    print("✓ cache_epoch klart ("
+          + ", ".join(f"{name} = {epochs[name]}" for name in EPOCHS) + ").")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
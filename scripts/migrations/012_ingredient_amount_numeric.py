@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Migration 012 — numeriska mängdkolumner på recipe_ingredient.
+
+Bakgrund: recipe_ingredient.amount är fritext ("1/2", "2-3", "efter smak").
+shopping_list() parsade om den med float() vid varje request och
+summerade bråk och intervall fel.
+
+Nya kolumner (bredvid originaltexten, som lämnas orörd):
+  recipe_ingredient
+    amount_min      REAL   -- tolkad mängd i unit_canonical, NULL om ej numerisk
+    amount_max      REAL   -- = amount_min utom för intervall ("2-3")
+    unit_canonical  TEXT   -- 'g' (g/hg/kg), 'ml' (krm/tsk/msk/ml/cl/dl/l),
+                              annars enheten själv normaliserad ('st', 'burk' …)
+
+Tolkningen är scripts/units.py::canonical_amount — samma funktion som
+app.py använder när ingredienser skrivs, så backfill och nya rader blir
+identiska. Summor kan därefter göras i SQL:
+    SELECT ingredient_id, unit_canonical, SUM(amount_max) ... GROUP BY 1, 2
+
+Idempotent: kolumnerna läggs bara till om de saknas och backfillen körs
+alltid om för alla rader (kan köras igen efter att parsern utökats).
+
+Använd som: python scripts/migrations/012_ingredient_amount_numeric.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scripts.units import canonical_amount, parse_amount  # noqa: E402
+
+NEW_COLUMNS = {
+    "amount_min": "REAL",
+    "amount_max": "REAL",
+    "unit_canonical": "TEXT",
+}
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    conn.execute("BEGIN")
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(recipe_ingredient)")}
+    for col, decl in NEW_COLUMNS.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE recipe_ingredient ADD COLUMN {col} {decl}")
+    rows = conn.execute("SELECT id, amount, unit FROM recipe_ingredient").fetchall()
+    conn.executemany(
+        "UPDATE recipe_ingredient "
+        "SET amount_min = ?, amount_max = ?, unit_canonical = ? WHERE id = ?",
+        [(*canonical_amount(amount, unit), rid) for rid, amount, unit in rows],
+    )
+    conn.execute("COMMIT")
+    return len(rows)
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+
+    try:
+        written = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    # Verifiera: varje numerisk mängd ska ha fått amount_max.
+    missing = [
+        (rid, amount) for rid, amount, amount_max in conn.execute(
+            "SELECT id, amount, amount_max FROM recipe_ingredient"
+        ).fetchall()
+        if parse_amount(amount) is not None and amount_max is None
+    ]
+    if missing:
+        print(f"✗ {len(missing)} rad(er) saknar amount_max: {missing[:10]}",
+              file=sys.stderr)
+        return 2
+
+    unparsed = conn.execute(
+        "SELECT count(*) FROM recipe_ingredient "
+        "WHERE amount_max IS NULL AND TRIM(COALESCE(amount, '')) != ''"
+    ).fetchone()[0]
+    print(f"✓ {written} rad(er) tolkade; {unparsed} med icke-numerisk mängd.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
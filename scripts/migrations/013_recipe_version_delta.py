@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Migration 013 — deltakodad versionshistorik.
+
+Bakgrund: varje edit skriver en full kopia av receptet till recipe_version
+(instructions, notes och hela ingredients_json), även när ändringen bara
+rättade ett stavfel. Historiken växer med antal edits × receptstorlek.
+
+Ny kolumn:
+  recipe_version
+    delta_json  TEXT   -- NULL = keyframe (full rad); annars ändringarna i
+                          description/instructions/notes/ingredients_json
+                          mot föregående version, och de kolumnerna är NULL
+
+Var KEYFRAME_INTERVAL:e version (10) är en keyframe, så en version byggs
+upp av högst tio rader. Titel, taggar, typ, kök och metadata lagras fullt
+på alla rader. Formatet och kodningen finns i scripts/version_store.py —
+samma kod som app.py skriver och läser med.
+
+Konverteringen kontrolleras i samma transaktion: varje historisk version
+materialiseras från den nya lagringen och jämförs fält för fält med
+originalet. Minsta avvikelse → ROLLBACK, inget ändras.
+
+Idempotent: kolumnen läggs bara till om den saknas; historiken
+materialiseras och kodas om från början vid varje körning (även redan
+deltakodade rader), så scriptet kan köras igen efter ändrat intervall.
+
+Använd som: python scripts/migrations/013_recipe_version_delta.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scripts.version_store import (  # noqa: E402
+    DELTA_FIELDS, KEYFRAME_INTERVAL, SNAPSHOT_FIELDS, compress_columns,
+    materialize, storage_columns,
+)
+
+
+def _stored_bytes(conn: sqlite3.Connection) -> int:
+    """Bytes held in the delta-encoded columns (+ delta_json if present)."""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe_version)")}
+    terms = " + ".join(f"COALESCE(length(CAST({c} AS BLOB)), 0)"
+                       for c in (*DELTA_FIELDS, "delta_json") if c in cols)
+    return conn.execute(
+        f"SELECT COALESCE(SUM({terms}), 0) FROM recipe_version"
+    ).fetchone()[0]
+
+
+def _zdicts(conn: sqlite3.Connection) -> dict[int, bytes]:
+    """Compression dictionaries from migration 014, if it has run."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'recipe_version_zdict'").fetchone():
+        return {}
+    return dict(conn.execute("SELECT id, zdict FROM recipe_version_zdict"))
+
+
+def _history(conn: sqlite3.Connection, recipe_id: int,
+             zdicts: dict[int, bytes]) -> dict[int, dict]:
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            "SELECT * FROM recipe_version WHERE recipe_id = ? "
+            "ORDER BY version_number", (recipe_id,)
+        ).fetchall()
+    finally:
+        conn.row_factory = None
+    return materialize(rows, zdicts=zdicts)
+
+
+def migrate(conn: sqlite3.Connection,
+            interval: int = KEYFRAME_INTERVAL) -> tuple[int, int]:
+    """Returns (rows rewritten, of which deltas)."""
+    conn.execute("BEGIN")
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe_version)")}
+    if "delta_json" not in cols:
+        conn.execute("ALTER TABLE recipe_version ADD COLUMN delta_json TEXT")
+
+    # Keep 014's compression when re-encoding after it has run.
+    zdicts = _zdicts(conn)
+    zdict_id = max(zdicts) if zdicts else None
+    written = deltas = 0
+    recipe_ids = [r[0] for r in conn.execute(
+        "SELECT DISTINCT recipe_id FROM recipe_version ORDER BY recipe_id"
+    )]
+    for rid in recipe_ids:
+        original = _history(conn, rid, zdicts)
+        prev, since = None, 0
+        for row in original.values():
+            stored = storage_columns(prev, row, since, interval)
+            since = 1 if stored["delta_json"] is None else since + 1
+            deltas += stored["delta_json"] is not None
+            conn.execute(
+                "UPDATE recipe_version SET "
+                + ", ".join(f"{c} = :{c}" for c in stored)
+                + " WHERE id = :id",
+                {**compress_columns(stored, zdict_id, zdicts.get(zdict_id)),
+                 "id": row["id"]},
+            )
+            written += 1
+            prev = row
+
+        # Round-trip: every version must materialize to exactly what it was.
+        rebuilt = _history(conn, rid, zdicts)
+        for v, row in original.items():
+            bad = [f for f in SNAPSHOT_FIELDS
+                   if v not in rebuilt or rebuilt[v][f] != row[f]]
+            if bad:
+                raise RuntimeError(
+                    f"recipe {rid} v{v}: {bad} differ after re-encoding"
+                )
+    conn.execute("COMMIT")
+    return written, deltas
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    before = _stored_bytes(conn)
+
+    try:
+        written, deltas = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    after = _stored_bytes(conn)
+    print(f"✓ {written} version(er) kodade om, {deltas} som delta; alla "
+          f"materialiseras identiskt. Historiktext {before} → {after} byte.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
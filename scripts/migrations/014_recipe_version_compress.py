@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Migration 014 — komprimerade textkolumner i recipe_version.
+
+Bakgrund: historiken är den snabbast växande tabellen. instructions, notes,
+ingredients_json och delta_json lagrades okomprimerade, och
+ingredients_json upprepar nycklar som "ingredient_id" och "amount" i varje
+snapshot. Det blåser upp backuperna och sidcachen.
+
+Ny tabell:
+  recipe_version_zdict
+    id          INTEGER PRIMARY KEY AUTOINCREMENT
+                                      -- refereras från varje komprimerat
+                                         värde, återanvänds aldrig
+    zdict       BLOB NOT NULL         -- förinställd deflate-ordbok, ≤ 32 KB
+    trained_at  TEXT NOT NULL
+    samples     INTEGER NOT NULL      -- antal värden den tränades på
+    trained_rows INTEGER              -- rader i recipe_version vid träningen
+
+Kolumnerna i version_store.COMPRESSED_FIELDS får BLOB (deflate mot
+ordboken) i stället för TEXT när det blir kortare. Formatet, träningen och
+dekomprimeringen finns i scripts/version_store.py. app.py komprimerar nya
+versioner och dekomprimerar bara när en version faktiskt läses (diff, API),
+aldrig för historiklistan.
+
+En ordbok tränas först när recipe_version har version_store.ZDICT_MIN_ROWS
+rader; på färre återkommer för få fragment mellan recept (testdatabasen gav
+en ordbok på 4 byte). Innan dess komprimeras ingenting. En ny ordbok tränas
+när tabellen vuxit till ZDICT_RETRAIN_GROWTH × trained_rows för den senaste
+— av den här migrationen, eller automatiskt av app.py efter en request som
+skrivit versioner, i en egen transaktion (_maybe_train_zdict). Ordböcker kortare än ZDICT_MIN_BYTES används
+aldrig för att komprimera.
+
+Ordböcker raderas aldrig: rader och app-processer som redan använder en
+äldre ordbok ska fortsätta kunna läsa den.
+
+Varje värde dekomprimeras och jämförs med originalet innan UPDATE; minsta
+avvikelse → ROLLBACK.
+
+Idempotent: en ordbok tränas bara när den är förfallen enligt ovan (eller
+med --retrain, som ändå kräver ZDICT_MIN_ROWS rader); alla värden
+komprimeras om med den senaste användbara, redan komprimerade värden med
+samma ordbok skrivs inte om. Finns ingen användbar ordbok skrivs värdena
+som TEXT. En recipe_version_zdict från en tidigare körning (utan
+AUTOINCREMENT eller trained_rows) byggs om med samma id:n.
+
+Använd som: python scripts/migrations/014_recipe_version_compress.py [db_path] [--retrain]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scripts.version_store import (  # noqa: E402
+    COMPRESSED_FIELDS, ZDICT_MIN_BYTES, ZDICT_MIN_ROWS, compress,
+    current_zdict_id, decompress, train_zdict, zdict_due,
+)
+
+BATCH = 500
+
+
+def _column_sizes(conn: sqlite3.Connection) -> dict[str, tuple[int, int, int]]:
+    """{column: (stored bytes, compressed values, non-null values)}."""
+    cols = ", ".join(
+        f"COALESCE(SUM(length(CAST({c} AS BLOB))), 0), "
+        f"SUM(typeof({c}) = 'blob'), COUNT({c})"
+        for c in COMPRESSED_FIELDS
+    )
+    row = conn.execute(f"SELECT {cols} FROM recipe_version").fetchone()
+    return {c: tuple(v or 0 for v in row[i * 3:i * 3 + 3])
+            for i, c in enumerate(COMPRESSED_FIELDS)}
+
+
+def _batches(conn: sqlite3.Connection):
+    last = 0
+    cols = ", ".join(COMPRESSED_FIELDS)
+    while True:
+        rows = conn.execute(
+            f"SELECT id, recipe_id, {cols} FROM recipe_version "
+            "WHERE id > ? ORDER BY id LIMIT ?", (last, BATCH)
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+ZDICT_TABLE_SQL = """
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        zdict BLOB NOT NULL,
+        trained_at TEXT NOT NULL,
+        samples INTEGER NOT NULL,
+        trained_rows INTEGER
+    )
+"""
+
+
+def _create_zdict_table(conn: sqlite3.Connection) -> None:
+    """Create recipe_version_zdict, or rebuild one from an earlier run of
+    this migration (plain INTEGER PRIMARY KEY, no trained_rows). Ids are
+    cited by every compressed value, so AUTOINCREMENT: an id is never
+    handed to a different dictionary, even after a delete."""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' "
+                       "AND name = 'recipe_version_zdict'").fetchone()
+    if row is None:
+        conn.execute(ZDICT_TABLE_SQL.format(name="recipe_version_zdict"))
+        return
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe_version_zdict)")}
+    if "AUTOINCREMENT" in row[0].upper() and "trained_rows" in cols:
+        return
+    trained_rows = "trained_rows" if "trained_rows" in cols else "NULL"
+    conn.execute(ZDICT_TABLE_SQL.format(name="recipe_version_zdict_new"))
+    # Explicit ids: AUTOINCREMENT's sequence starts after the largest.
+    conn.execute(f"""
+        INSERT INTO recipe_version_zdict_new
+            (id, zdict, trained_at, samples, trained_rows)
+        SELECT id, zdict, trained_at, samples, {trained_rows}
+        FROM recipe_version_zdict
+    """)
+    conn.execute("DROP TABLE recipe_version_zdict")
+    conn.execute("ALTER TABLE recipe_version_zdict_new RENAME TO recipe_version_zdict")
+
+
+def migrate(conn: sqlite3.Connection, retrain: bool = False) -> tuple[int | None, int]:
+    """Returns (dictionary id or None if there is no usable one yet, rows
+    rewritten)."""
+    conn.execute("BEGIN")
+    _create_zdict_table(conn)
+    zdicts = dict(conn.execute("SELECT id, zdict FROM recipe_version_zdict"))
+
+    row_count = conn.execute("SELECT COUNT(*) FROM recipe_version").fetchone()[0]
+    # Dictionaries from before trained_rows count as trained on nothing.
+    latest = conn.execute(
+        "SELECT COALESCE(trained_rows, 0) FROM recipe_version_zdict "
+        "WHERE length(zdict) >= ? ORDER BY id DESC LIMIT 1", (ZDICT_MIN_BYTES,)
+    ).fetchone()
+    if row_count >= ZDICT_MIN_ROWS and (
+            retrain or zdict_due(row_count, latest[0] if latest else None)):
+        samples = [
+            (row[1], decompress(value, zdicts))
+            for rows in _batches(conn) for row in rows
+            for value in row[2:] if value
+        ]
+        zdict = train_zdict(samples)
+        if len(zdict) >= ZDICT_MIN_BYTES:
+            zdict_id = conn.execute(
+                "INSERT INTO recipe_version_zdict "
+                "(zdict, trained_at, samples, trained_rows) VALUES (?, ?, ?, ?)",
+                (zdict, datetime.now(timezone.utc).isoformat(), len(samples),
+                 row_count),
+            ).lastrowid
+            zdicts[zdict_id] = zdict
+    zdict_id = current_zdict_id(zdicts)
+
+    written = 0
+    for rows in _batches(conn):
+        updates = []
+        for row in rows:
+            new = {}
+            for col, value in zip(COMPRESSED_FIELDS, row[2:]):
+                plain = decompress(value, zdicts)
+                packed = (compress(plain, zdict_id, zdicts[zdict_id])
+                          if zdict_id is not None else plain)
+                if decompress(packed, zdicts) != plain:
+                    raise RuntimeError(
+                        f"recipe_version id={row[0]} {col}: round-trip mismatch"
+                    )
+                new[col] = packed
+            if list(new.values()) != list(row[2:]):
+                updates.append({**new, "id": row[0]})
+        if updates:
+            conn.executemany(
+                "UPDATE recipe_version SET "
+                + ", ".join(f"{c} = :{c}" for c in COMPRESSED_FIELDS)
+                + " WHERE id = :id",
+                updates,
+            )
+            written += len(updates)
+    conn.execute("COMMIT")
+    return zdict_id, written
+
+
+def main() -> int:
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    db_path = Path(args[0] if args else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    before = _column_sizes(conn)
+
+    try:
+        zdict_id, written = migrate(conn, retrain="--retrain" in sys.argv)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    after = _column_sizes(conn)
+    print(f"{'kolumn':<18}{'före':>12}{'efter':>12}{'komprimerade':>16}")
+    for col in COMPRESSED_FIELDS:
+        b, a = before[col], after[col]
+        print(f"{col:<18}{b[0]:>10} B{a[0]:>10} B{a[1]:>9}/{a[2]}")
+    total_b = sum(v[0] for v in before.values())
+    total_a = sum(v[0] for v in after.values())
+    print(f"{'totalt':<18}{total_b:>10} B{total_a:>10} B")
+
+    page_size, pages, free = (conn.execute(f"PRAGMA {p}").fetchone()[0]
+                              for p in ("page_size", "page_count",
+                                        "freelist_count"))
+    if zdict_id is None:
+        rows = conn.execute("SELECT COUNT(*) FROM recipe_version").fetchone()[0]
+        why = (f"{rows} rad(er), träning kräver {ZDICT_MIN_ROWS}"
+               if rows < ZDICT_MIN_ROWS else
+               f"ordboken blev kortare än {ZDICT_MIN_BYTES} B")
+        print(f"Ingen användbar ordbok ({why}) — värdena lagras okomprimerade.")
+    else:
+        zdict_bytes = conn.execute(
+            "SELECT length(zdict) FROM recipe_version_zdict WHERE id = ?",
+            (zdict_id,),
+        ).fetchone()[0]
+        print(f"Ordbok id={zdict_id}: {zdict_bytes} B.")
+    print(f"Fil: {pages * page_size} B, "
+          f"varav {free * page_size} B lediga sidor (VACUUM krymper filen).")
+    print(f"✓ {written} rad(er) omskrivna.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Migration 015 — sparade diffar mellan på varandra följande versioner.
+
+Bakgrund: recipe_diff läste två fulla versionsrader och körde difflib.ndiff
+över varje ändrat textfält vid varje sidvisning. På långa instructions är
+ndiff långsam och kan bli kvadratisk.
+
+Ny tabell:
+  recipe_version_diff
+    recipe_id     INTEGER NOT NULL REFERENCES recipe(id) ON DELETE CASCADE
+    from_version  INTEGER NOT NULL   -- föregående version
+    to_version    INTEGER NOT NULL
+    engine        INTEGER NOT NULL   -- version_diff.DIFF_ENGINE vid beräkning
+    diff_json     TEXT NOT NULL      -- version_diff.diff_versions() som JSON
+    PRIMARY KEY (recipe_id, from_version, to_version)   -- WITHOUT ROWID
+
+Härledd cache: app.py skriver diffen mot föregående version i samma
+transaktion som en ny version (_insert_version) och läser den i
+recipe_diff. Diffar mellan icke-angränsande versioner, och par som saknas
+här (rader skrivna runt appen), beräknas vid visning och hålls i en
+LRU-cache i processen. Rader med gammal engine räknas om vid visning.
+
+Idempotent: tabellen skapas om den saknas och alla angränsande par räknas
+om, så scriptet kan köras igen efter att DIFF_ENGINE höjts.
+
+Använd som: python scripts/migrations/015_recipe_version_diff.py [db_path]
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from scripts.version_diff import DIFF_ENGINE, diff_versions  # noqa: E402
+from scripts.version_store import materialize  # noqa: E402
+
+
+def _zdicts(conn: sqlite3.Connection) -> dict[int, bytes]:
+    """Compression dictionaries from migration 014, if it has run."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'recipe_version_zdict'").fetchone():
+        return {}
+    return dict(conn.execute("SELECT id, zdict FROM recipe_version_zdict"))
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    conn.execute("BEGIN")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recipe_version_diff (
+            recipe_id INTEGER NOT NULL
+                REFERENCES recipe(id) ON DELETE CASCADE,
+            from_version INTEGER NOT NULL,
+            to_version INTEGER NOT NULL,
+            engine INTEGER NOT NULL,
+            diff_json TEXT NOT NULL,
+            PRIMARY KEY (recipe_id, from_version, to_version)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM recipe_version_diff")
+
+    zdicts = _zdicts(conn)
+    recipe_ids = [r[0] for r in conn.execute(
+        "SELECT DISTINCT recipe_id FROM recipe_version "
+        "WHERE recipe_id IN (SELECT id FROM recipe) ORDER BY recipe_id"
+    )]
+    written = 0
+    conn.row_factory = sqlite3.Row
+    try:
+        for rid in recipe_ids:
+            rows = conn.execute(
+                "SELECT * FROM recipe_version WHERE recipe_id = ? "
+                "ORDER BY version_number", (rid,)
+            ).fetchall()
+            versions = list(materialize(rows, zdicts=zdicts).values())
+            pairs = [
+                (rid, a["version_number"], b["version_number"], DIFF_ENGINE,
+                 json.dumps(diff_versions(a, b), ensure_ascii=False))
+                for a, b in zip(versions, versions[1:])
+            ]
+            conn.executemany(
+                "INSERT INTO recipe_version_diff "
+                "(recipe_id, from_version, to_version, engine, diff_json) "
+                "VALUES (?, ?, ?, ?, ?)", pairs,
+            )
+            written += len(pairs)
+    finally:
+        conn.row_factory = None
+    conn.execute("COMMIT")
+    return written
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+
+    try:
+        written = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    # Verifiera: ett sparat par per angränsande versioner.
+    expected = conn.execute("""
+        SELECT COALESCE(SUM(n - 1), 0) FROM (
+            SELECT COUNT(*) AS n FROM recipe_version
+            WHERE recipe_id IN (SELECT id FROM recipe) GROUP BY recipe_id
+        )
+    """).fetchone()[0]
+    if written != expected:
+        print(f"✗ {written} diff(ar) sparade, väntade {expected}",
+              file=sys.stderr)
+        return 2
+
+    print(f"✓ recipe_version_diff byggt: {written} diff(ar).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Migration 016 — recipe.current_version.
+
+Bakgrund: apply_recipe_edit, api_recipe_get och shoppinglistans cache
+räknade fram aktuell version med
+    SELECT COALESCE(MAX(version_number), 0) FROM recipe_version WHERE recipe_id = ?
+på varje request, och konfliktkontrollen läste versionen i en separat
+query före skrivningen.
+
+Ny kolumn:
+  recipe
+    current_version  INTEGER NOT NULL DEFAULT 0
+                     -- = MAX(recipe_version.version_number), 0 utan historik
+
+app.py håller kolumnen aktuell i samma transaktion som versionsraden
+skrivs: new_recipe sätter 1, apply_recipe_edit gör en compare-and-swap
+    UPDATE recipe SET current_version = :next
+    WHERE id = :id AND current_version = :expected
+och 0 påverkade rader betyder versionskonflikt. skill_remote_commit.py
+skriver den på samma sätt.
+
+Idempotent: kolumnen läggs bara till om den saknas och backfillen körs
+alltid om från recipe_version (körs även av bulk_load efter import).
+
+Använd som: python scripts/migrations/016_recipe_current_version.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    conn.execute("BEGIN")
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(recipe)")}
+    if "current_version" not in existing:
+        conn.execute("ALTER TABLE recipe ADD COLUMN "
+                     "current_version INTEGER NOT NULL DEFAULT 0")
+    written = conn.execute("""
+        UPDATE recipe SET current_version = COALESCE((
+            SELECT MAX(version_number) FROM recipe_version
+            WHERE recipe_id = recipe.id
+        ), 0)
+    """).rowcount
+    conn.execute("COMMIT")
+    return written
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+
+    try:
+        written = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+
+    # Verifiera: current_version ska vara senaste versionen för alla recept.
+    drift = conn.execute("""
+        SELECT r.id, r.current_version, MAX(v.version_number)
+        FROM recipe r LEFT JOIN recipe_version v ON v.recipe_id = r.id
+        GROUP BY r.id
+        HAVING r.current_version IS NOT COALESCE(MAX(v.version_number), 0)
+    """).fetchall()
+    if drift:
+        print(f"✗ {len(drift)} recept med fel current_version: {drift[:10]}",
+              file=sys.stderr)
+        return 2
+
+    print(f"✓ current_version satt för {written} recept.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
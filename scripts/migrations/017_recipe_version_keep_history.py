@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Migration 017 — versionshistoriken överlever sitt recept.
+
+Bakgrund: recipe_version hade FOREIGN KEY (recipe_id) REFERENCES recipe(id)
+(utan eller med ON DELETE CASCADE beroende på vilken migration som senast
+byggde om tabellen). Med foreign_keys på blockerade den en radering, så
+delete_recipe raderade historiken explicit — och därmed just den historik
+som recipe_version finns för att spara.
+
+Ändring: recipe_version byggs om utan främmande nyckel. delete_recipe
+skriver en sista version med receptets tillstånd före raderingen och låter
+sedan alla versionsrader ligga kvar, så ett raderat recept kan återskapas
+ur historiken. recipe.id är AUTOINCREMENT (migration 003), så ett nytt
+recept får aldrig ett raderat recepts id och ärver inte dess historik.
+
+recipe_version_diff behåller sin ON DELETE CASCADE: den är en härledd cache
+och 015 bygger bara om den för recept som finns.
+
+Idempotent: no-op om recipe_version redan saknar främmande nyckel.
+
+Använd som: python scripts/migrations/017_recipe_version_keep_history.py [db_path]
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+COLUMNS = (
+    "id", "recipe_id", "version_number", "title", "description",
+    "instructions", "notes", "tags", "type", "kitchen", "ingredients_json",
+    "changed_at", "changed_by", "change_note", "delta_json",
+)
+
+
+def has_foreign_key(conn: sqlite3.Connection) -> bool:
+    return bool(conn.execute(
+        "PRAGMA foreign_key_list(recipe_version)"
+    ).fetchall())
+
+
+def migrate(conn: sqlite3.Connection) -> bool:
+    """Rebuild recipe_version without its FK. Returns False if there was
+    nothing to do."""
+    if not has_foreign_key(conn):
+        return False
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(recipe_version)")}
+    cols = ", ".join(c for c in COLUMNS if c in existing)
+    # Not changeable inside a transaction; the rebuild drops the old table.
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("BEGIN")
+    conn.execute("""
+        CREATE TABLE recipe_version_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipe_id INTEGER NOT NULL,
+            version_number INTEGER NOT NULL,
+            title TEXT,
+            description TEXT,
+            instructions TEXT,
+            notes TEXT,
+            tags TEXT,
+            type TEXT,
+            kitchen TEXT,
+            ingredients_json TEXT,
+            changed_at TEXT NOT NULL,
+            changed_by TEXT,
+            change_note TEXT,
+            delta_json TEXT,
+            UNIQUE (recipe_id, version_number)
+        )
+    """)
+    conn.execute(f"INSERT INTO recipe_version_new ({cols}) "
+                 f"SELECT {cols} FROM recipe_version")
+    conn.execute("DROP TABLE recipe_version")
+    conn.execute("ALTER TABLE recipe_version_new RENAME TO recipe_version")
+    conn.execute(
+        "CREATE INDEX idx_recipe_version_recipe "
+        "ON recipe_version(recipe_id, version_number)"
+    )
+    # Reseed sequence (table was dropped, sqlite_sequence row removed).
+    max_id = conn.execute(
+        "SELECT COALESCE(MAX(id), 0) FROM recipe_version"
+    ).fetchone()[0]
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'recipe_version'")
+    conn.execute(
+        "INSERT INTO sqlite_sequence(name, seq) VALUES (?, ?)",
+        ("recipe_version", max_id),
+    )
+    conn.execute("COMMIT")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return True
+
+
+def main() -> int:
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else "recipe.db")
+    if not db_path.exists():
+        print(f"✗ DB not found: {db_path}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+
+    before = conn.execute("SELECT COUNT(*) FROM recipe_version").fetchone()[0]
+    try:
+        rebuilt = migrate(conn)
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        print(f"✗ Migration failed: {e}", file=sys.stderr)
+        return 1
+    if not rebuilt:
+        print("✓ recipe_version saknar redan främmande nyckel. No-op.")
+        return 0
+
+    after = conn.execute("SELECT COUNT(*) FROM recipe_version").fetchone()[0]
+    if before != after:
+        print(f"✗ Row count changed: {before} → {after}", file=sys.stderr)
+        return 2
+
+    print(f"✓ recipe_version ombyggd utan främmande nyckel ({after} rader).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
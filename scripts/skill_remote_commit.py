@@ -13,13 +13,18 @@ import sys
 
 
 VPS = 'minvps'
-DB_PATH = '/opt/recipe-db/data/recipe.db'
+APP_DIR = '/opt/recipe-db'
+DB_PATH = f'{APP_DIR}/data/recipe.db'
 
 
 def build_vps_script(commit_b64: str) -> str:
-    return f"""import sqlite3, json, base64
+    return f"""import sqlite3, json, base64, sys
 from datetime import datetime, timezone
 
+# The deployed checkout's scripts/units.py — the same parser app.py uses.
+sys.path.insert(0, '{APP_DIR}/scripts')
+from units import canonical_amount
+
 DB = '{DB_PATH}'
 commit = json.loads(base64.b64decode('{commit_b64}').decode())
 op = commit.get('operation', 'create')
@@ -35,6 +40,41 @@ def read_ings(recipe_id):
         WHERE ri.recipe_id = ?
     ''', (recipe_id,)).fetchall()
 
+def refresh_fts(recipe_id):
+    # recipe_fts.ingredients (migration 008): once per write, not per link.
+    cur.execute('''
+        UPDATE recipe_fts SET ingredients = (
+            SELECT coalesce(group_concat(name, ', '), '') FROM (
+                SELECT i.name FROM recipe_ingredient ri
+                JOIN ingredient i ON i.id = ri.ingredient_id
+                WHERE ri.recipe_id = ?
+                ORDER BY ri.id
+            )
+        )
+        WHERE rowid = ?
+    ''', (recipe_id, recipe_id))
+
+def sync_tags(recipe_id, raw_tags):
+    # recipe_tag (migration 010), as app.py's _sync_recipe_tags: one row per
+    # trimmed tag; OR IGNORE keeps the first spelling (tag is COLLATE NOCASE).
+    cur.execute("DELETE FROM recipe_tag WHERE recipe_id=?", (recipe_id,))
+    cur.executemany(
+        "INSERT OR IGNORE INTO recipe_tag (recipe_id, tag) VALUES (?, ?)",
+        [(recipe_id, t.strip()) for t in (raw_tags or '').split(',') if t.strip()],
+    )
+
+def insert_link(recipe_id, ing_id, ing):
+    # amount_min/amount_max/unit_canonical (migration 012), as app.py's
+    # _link_row: the shopping list sums these, not the text.
+    amount = str(ing.get('amount', '') or '')
+    unit = ing.get('unit', '') or ''
+    cur.execute('''
+        INSERT INTO recipe_ingredient (recipe_id, ingredient_id, amount, unit, note,
+            amount_min, amount_max, unit_canonical)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (recipe_id, ing_id, amount, unit, ing.get('note', '') or '',
+          *canonical_amount(amount, unit)))
+
 def upsert_ingredient(ing):
     name = ing.get('name', '')
     row = cur.execute("SELECT id FROM ingredient WHERE LOWER(name)=LOWER(?) AND id IS NOT NULL", (name,)).fetchone()
@@ -52,26 +92,24 @@ try:
     now = datetime.now(timezone.utc).isoformat()
 
     if op == 'create':
-        # The recipe.id column is plain INTEGER (not INTEGER PRIMARY KEY), so
-        # SQLite won't auto-assign it. Compute the next free id explicitly,
-        # otherwise id would stay NULL and /recipe/<id> can't find the row.
-        recipe_id = cur.execute(
-            "SELECT COALESCE(MAX(id), 0) + 1 FROM recipe"
-        ).fetchone()[0]
+        # recipe.id is AUTOINCREMENT (migration 003), so a deleted recipe's
+        # id — and the history it leaves behind (migration 017) — is never
+        # reused.
         cur.execute('''
-            INSERT INTO recipe (id, title, description, instructions, notes, tags, type, kitchen)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (recipe_id, commit.get('title'), commit.get('description'), commit.get('instructions'),
+            INSERT INTO recipe (title, description, instructions, notes, tags, type, kitchen,
+                current_version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ''', (commit.get('title'), commit.get('description'), commit.get('instructions'),
               commit.get('notes'), commit.get('tags'),
               commit.get('type'), commit.get('kitchen')))
+        recipe_id = cur.lastrowid
+        sync_tags(recipe_id, commit.get('tags'))
 
         for ing in commit.get('ingredients', []):
             ing_id = upsert_ingredient(ing)
             if ing_id:
-                cur.execute('''
-                    INSERT INTO recipe_ingredient (recipe_id, ingredient_id, amount, unit, note)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (recipe_id, ing_id, ing.get('amount', ''), ing.get('unit', ''), ing.get('note', '')))
+                insert_link(recipe_id, ing_id, ing)
+        refresh_fts(recipe_id)
 
         ings_json = json.dumps([dict(r) for r in read_ings(recipe_id)], ensure_ascii=False)
         cur.execute('''
@@ -90,9 +128,7 @@ try:
             raise ValueError(f"Recipe {{recipe_id}} not found")
 
         cur_ings = read_ings(recipe_id)
-        next_ver = cur.execute(
-            "SELECT COALESCE(MAX(version_number),0)+1 FROM recipe_version WHERE recipe_id=?", (recipe_id,)
-        ).fetchone()[0]
+        next_ver = cur_recipe['current_version'] + 1
 
         cur.execute('''
             INSERT INTO recipe_version (recipe_id, version_number, title, description, instructions,
@@ -108,7 +144,7 @@ try:
 
         cur.execute('''
             UPDATE recipe SET title=?, description=?, instructions=?, notes=?,
-                tags=?, type=?, kitchen=? WHERE id=?
+                tags=?, type=?, kitchen=?, current_version=? WHERE id=?
         ''', (
             commit.get('title', cur_recipe['title']),
             commit.get('description', cur_recipe['description']),
@@ -117,18 +153,19 @@ try:
             commit.get('tags', cur_recipe['tags']),
             commit.get('type', cur_recipe['type']),
             commit.get('kitchen', cur_recipe['kitchen']),
+            next_ver,
             recipe_id
         ))
+        if 'tags' in commit:
+            sync_tags(recipe_id, commit['tags'])
 
         if 'ingredients' in commit:
             cur.execute("DELETE FROM recipe_ingredient WHERE recipe_id=?", (recipe_id,))
             for ing in commit['ingredients']:
                 ing_id = upsert_ingredient(ing)
                 if ing_id:
-                    cur.execute('''
-                        INSERT INTO recipe_ingredient (recipe_id, ingredient_id, amount, unit, note)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (recipe_id, ing_id, ing.get('amount', ''), ing.get('unit', ''), ing.get('note', '')))
+                    insert_link(recipe_id, ing_id, ing)
+            refresh_fts(recipe_id)
     else:
         raise ValueError(f"Unknown operation: {{op}}")
 
@@ -0,0 +1,292 @@
+"""
+Unit conversion and quantity aggregation for recipe amounts, used by
+app.py's shopping list.
+
+Units fall in three groups:
+
+    mass     g, hg, kg                    (base: g)
+    volume   krm, tsk, msk, ml, cl, dl, l (base: ml)
+    count    st and every other unit (burk, klyfta, knippe, …) — only
+             summed with the same unit
+
+canonical_amount() turns an amount as written into (min, max, unit) in
+the group's base unit. app.py stores that next to the original text in
+recipe_ingredient (amount_min, amount_max, unit_canonical), so totals can
+be summed in SQL without re-parsing.
+
+An ingredient's catalog default_unit decides which group its total is
+expressed in. Amounts in another group are converted through
+DENSITY_G_PER_ML (volume <-> mass) and PIECE_GRAMS (st <-> mass/volume)
+when the ingredient has an entry; otherwise they stay a separate part of
+the same line ("500 g + 2 st").
+"""
+from __future__ import annotations
+
+import re
+from fractions import Fraction
+
+# Unit groups are named after their base unit, which is also what
+# recipe_ingredient.unit_canonical stores.
+MASS, VOLUME = "g", "ml"
+
+# unit -> (group, factor to the group's base unit)
+UNITS: dict[str, tuple[str, float]] = {
+    "g": (MASS, 1.0),
+    "hg": (MASS, 100.0),
+    "kg": (MASS, 1000.0),
+    "krm": (VOLUME, 1.0),
+    "tsk": (VOLUME, 5.0),
+    "msk": (VOLUME, 15.0),
+    "ml": (VOLUME, 1.0),
+    "cl": (VOLUME, 10.0),
+    "dl": (VOLUME, 100.0),
+    "l": (VOLUME, 1000.0),
+}
+
+UNIT_ALIASES = {
+    "gram": "g", "kilo": "kg", "liter": "l", "lit": "l",
+    "st.": "st", "stycken": "st", "styck": "st", "": "st",
+}
+
+# g per ml, for ingredients commonly measured both by weight and volume.
+DENSITY_G_PER_ML: dict[str, float] = {
+    "vetemjöl": 0.6,
+    "ströbröd": 0.4,
+    "socker": 0.85,
+    "farinsocker": 0.75,
+    "salt": 1.2,
+    "flingsalt": 0.6,
+    "smör": 0.95,
+    "parmesanost": 0.4,
+    "riven smakrik ost": 0.4,
+    "ris": 0.85,
+    "basmatiris": 0.85,
+    "jasminris": 0.85,
+    "krossade tomater": 1.05,
+    "passata": 1.05,
+    "kokosgrädde": 1.0,
+    "mjölk": 1.03,
+    "vispgrädde": 1.0,
+    "gräddfil": 1.0,
+}
+
+# Typical weight of one "st", for produce bought by weight but written
+# per piece (or the reverse).
+PIECE_GRAMS: dict[str, float] = {
+    "potatis": 100.0,
+    "fast potatis": 100.0,
+    "mjölig potatis": 100.0,
+    "rotselleri": 600.0,
+    "gullök": 150.0,
+    "rödlök": 150.0,
+    "morot": 80.0,
+    "paprika": 150.0,
+    "röd paprika": 150.0,
+    "ägg": 60.0,
+    "kycklinglårfilé": 100.0,
+}
+
+# Separator for aggregate()'s 'unparsed' column (SQL: group_concat(…, char(31))).
+UNPARSED_SEP = "\x1f"
+
+_UNICODE_FRACTIONS = {"½": "1/2", "¼": "1/4", "¾": "3/4", "⅓": "1/3", "⅔": "2/3"}
+_NUMBER = re.compile(r"^(?:(\d+)\s+)?(\d+(?:\.\d+)?)(?:/(\d+))?$")
+_RANGE = re.compile(r"^(.+?)\s*(?:-|–|—|till)\s*(.+)$")
+
+
+_AMOUNT_TOKEN = r"(?:\d+[½¼¾⅓⅔]|[½¼¾⅓⅔]|\d+(?:[.,]\d+)?(?:\s+\d+/\d+|/\d+)?)"
+_AMOUNT_PREFIX = re.compile(
+    rf"^\s*({_AMOUNT_TOKEN}(?:\s*(?:-|–|—)\s*{_AMOUNT_TOKEN})?)(?=\s|$)"
+)
+
+
+def split_amount(line: str) -> tuple[str, str]:
+    """Split a leading amount ("1 1/2", "2-3", "½") off a line of text.
+    Returns (amount_text, rest); amount_text is '' when the line doesn't
+    start with one."""
+    m = _AMOUNT_PREFIX.match(line or "")
+    if not m:
+        return "", (line or "").strip()
+    return m.group(1), line[m.end():].strip()
+
+
+def normalize_unit(unit: str | None) -> str:
+    u = (unit or "").strip().lower()
+    return UNIT_ALIASES.get(u, u)
+
+
+def _parse_number(s: str) -> float | None:
+    m = _NUMBER.match(s)
+    if not m:
+        return None
+    whole, num, den = m.groups()
+    if den is not None:
+        if "." in num or int(den) == 0:
+            return None
+        value = Fraction(int(num), int(den))
+    else:
+        value = Fraction(num)
+    if whole is not None:
+        if den is None:
+            return None  # "1 2" is not a number
+        value += int(whole)
+    return float(value)
+
+
+def parse_amount(raw) -> tuple[float, float] | None:
+    """(min, max) for an amount as written in a recipe: 2, "1,5", "1/2",
+    "1 1/2", "½", "2-3". Returns None for blank or non-numeric text
+    ("efter smak")."""
+    if raw is None or isinstance(raw, bool):
+        return None
+    if isinstance(raw, (int, float)):
+        return float(raw), float(raw)
+    s = str(raw).strip().lower().replace(",", ".")
+    for uni, ascii_ in _UNICODE_FRACTIONS.items():
+        s = s.replace(uni, f" {ascii_}")
+    s = re.sub(r"\s+", " ", s).strip()
+    if not s:
+        return None
+    value = _parse_number(s)
+    if value is not None:
+        return value, value
+    m = _RANGE.match(s)
+    if m:
+        lo, hi = _parse_number(m.group(1)), _parse_number(m.group(2))
+        if lo is not None and hi is not None:
+            return min(lo, hi), max(lo, hi)
+    return None
+
+
+def canonical_amount(amount, unit) -> tuple[float | None, float | None, str]:
+    """(amount_min, amount_max, unit_canonical) for one recipe row: the
+    parsed amount converted to its group's base unit (g, ml, or the count
+    unit itself). min/max are None when the amount isn't numeric."""
+    value_unit = normalize_unit(unit)
+    canonical = group_of(value_unit)
+    parsed = parse_amount(amount)
+    if parsed is None:
+        return None, None, canonical
+    lo, _ = to_base(parsed[0], value_unit)
+    hi, _ = to_base(parsed[1], value_unit)
+    return lo, hi, canonical
+
+
+def group_of(unit: str) -> str:
+    """MASS, VOLUME, or the (normalized) unit itself for count units."""
+    unit = normalize_unit(unit)
+    return UNITS[unit][0] if unit in UNITS else unit
+
+
+def to_base(value: float, unit: str) -> tuple[float, str]:
+    """value in unit -> (value in the group's base unit, group)."""
+    unit = normalize_unit(unit)
+    if unit in UNITS:
+        group, factor = UNITS[unit]
+        return value * factor, group
+    return value, unit
+
+
+def convert(value: float, from_group: str, to_group: str,
+            ingredient: str) -> float | None:
+    """Convert a base-unit value between groups for one ingredient, or
+    None when the ingredient has no density/piece weight to do it with."""
+    if from_group == to_group:
+        return value
+    key = (ingredient or "").strip().lower()
+    density = DENSITY_G_PER_ML.get(key)
+    piece = PIECE_GRAMS.get(key)
+    grams = None
+    if from_group == MASS:
+        grams = value
+    elif from_group == VOLUME and density:
+        grams = value * density
+    elif from_group == "st" and piece:
+        grams = value * piece
+    if grams is None:
+        return None
+    if to_group == MASS:
+        return grams
+    if to_group == VOLUME and density:
+        return grams / density
+    if to_group == "st" and piece:
+        return grams / piece
+    return None
+
+
+def _fmt_number(v: float) -> str:
+    if abs(v - round(v)) < 0.005:
+        return str(int(round(v)))
+    return f"{v:.2f}".rstrip("0").rstrip(".")
+
+
+def format_quantity(value: float, group: str) -> str:
+    """Human-friendly text for a base-unit value: 1500 g -> "1.5 kg",
+    45 ml -> "3 msk", 3 st -> "3 st"."""
+    if group == MASS:
+        if value >= 1000:
+            return f"{_fmt_number(value / 1000)} kg"
+        return f"{_fmt_number(round(value) if value >= 10 else value)} g"
+    if group == VOLUME:
+        for unit, threshold in (("l", 1000), ("dl", 100), ("msk", 15),
+                                ("tsk", 5)):
+            if value >= threshold:
+                return f"{_fmt_number(value / UNITS[unit][1])} {unit}"
+        return f"{_fmt_number(value)} krm"
+    return f"{_fmt_number(value)} {group}".rstrip()
+
+
+def aggregate(rows) -> list[dict]:
+    """One pass over rows that are already in canonical form (mappings
+    with ingredient_id, name, default_unit, unit_canonical and amount_max,
+    typically SUM()med per (ingredient, unit_canonical) in SQL, plus an
+    optional 'unparsed': the non-numeric amounts of the group as written,
+    joined with UNPARSED_SEP) -> one entry per ingredient, in first-seen
+    order:
+
+        {'ingredient_id', 'name', 'parts': [(base_value, group), ...],
+         'texts': [unparsed amount, ...], 'amount': display text}
+
+    Totals are moved into the group of the ingredient's default_unit where
+    a conversion exists. Non-numeric amounts ("en nypa", "efter smak")
+    can't be summed; they are kept as written, once each, after the
+    numeric total ("500 g + efter smak").
+    """
+    totals: dict[int, dict] = {}
+    for row in rows:
+        entry = totals.get(row["ingredient_id"])
+        if entry is None:
+            entry = totals[row["ingredient_id"]] = {
+                "ingredient_id": row["ingredient_id"],
+                "name": row["name"],
+                "target": group_of(row["default_unit"]),
+                "sums": {},
+                "texts": [],
+            }
+        for t in (row.get("unparsed") or "").split(UNPARSED_SEP):
+            if t and t not in entry["texts"]:
+                entry["texts"].append(t)
+        value, group = row["amount_max"], row["unit_canonical"]
+        if value is None:
+            continue
+        converted = convert(value, group, entry["target"], entry["name"])
+        if converted is not None:
+            value, group = converted, entry["target"]
+        entry["sums"][group] = entry["sums"].get(group, 0.0) + value
+
+    out = []
+    for entry in totals.values():
+        target = entry["target"]
+        # The default-unit group first, then leftovers in a stable order.
+        parts = sorted(entry["sums"].items(),
+                       key=lambda kv: (kv[0] != target, kv[0]))
+        out.append({
+            "ingredient_id": entry["ingredient_id"],
+            "name": entry["name"],
+            "parts": [(v, g) for g, v in parts],
+            "texts": entry["texts"],
+            "amount": " + ".join(
+                [format_quantity(v, g) for g, v in parts] + entry["texts"]
+            ),
+        })
+    return out
@@ -0,0 +1,81 @@
+"""
+Diffs between two materialized recipe versions, for app.py's
+/recipe/<id>/diff and the stored diffs in recipe_version_diff
+(migration 015).
+
+diff_lines() replaces difflib.ndiff: ndiff looks for the most similar
+line pair inside every changed block and then diffs those character by
+character, which goes quadratic on long instructions. Here common leading
+and trailing lines are trimmed first, the rest is matched line by line
+with SequenceMatcher, and a block whose line-pair count exceeds
+DIFF_MAX_CELLS is shown as a whole removal + addition instead of being
+matched at all. The output keeps ndiff's "  ", "- ", "+ " line prefixes
+(without its "? " hint lines), so recipe_diff.html renders it as before.
+
+DIFF_ENGINE is stored with each diff; bump it when the output changes so
+stored diffs are recomputed rather than served stale.
+"""
+from __future__ import annotations
+
+import json
+from difflib import SequenceMatcher
+
+DIFF_ENGINE = 1
+DIFF_MAX_CELLS = 250_000
+TEXT_FIELDS = ("title", "description", "instructions", "notes", "tags",
+               "type", "kitchen")
+
+
+def diff_lines(a: str, b: str) -> list[str]:
+    a_lines = a.splitlines(keepends=True)
+    b_lines = b.splitlines(keepends=True)
+    head = 0
+    while (head < len(a_lines) and head < len(b_lines)
+           and a_lines[head] == b_lines[head]):
+        head += 1
+    tail = 0
+    while (tail < len(a_lines) - head and tail < len(b_lines) - head
+           and a_lines[-1 - tail] == b_lines[-1 - tail]):
+        tail += 1
+    mid_a = a_lines[head:len(a_lines) - tail]
+    mid_b = b_lines[head:len(b_lines) - tail]
+
+    out = ["  " + line for line in a_lines[:head]]
+    if len(mid_a) * len(mid_b) > DIFF_MAX_CELLS:
+        opcodes = [("replace", 0, len(mid_a), 0, len(mid_b))]
+    else:
+        opcodes = SequenceMatcher(None, mid_a, mid_b,
+                                  autojunk=False).get_opcodes()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            out.extend("  " + line for line in mid_a[i1:i2])
+            continue
+        out.extend("- " + line for line in mid_a[i1:i2])
+        out.extend("+ " + line for line in mid_b[j1:j2])
+    out.extend("  " + line for line in a_lines[len(a_lines) - tail:])
+    return out
+
+
+def diff_versions(ver_a, ver_b) -> dict:
+    """{'fields': {field: diff lines}, 'ingredients': [(status, name, a, b)]}
+    for two full version rows. Only changed text fields are listed;
+    ingredients are matched by name and listed when added, removed or
+    changed (amount, unit or note), sorted by name."""
+    fields = {}
+    for f in TEXT_FIELDS:
+        a_val, b_val = ver_a[f] or "", ver_b[f] or ""
+        if a_val != b_val:
+            fields[f] = diff_lines(a_val, b_val)
+
+    ings_a = {i["name"]: i for i in json.loads(ver_a["ingredients_json"] or "[]")}
+    ings_b = {i["name"]: i for i in json.loads(ver_b["ingredients_json"] or "[]")}
+    ingredients = []
+    for name in sorted(set(ings_a) | set(ings_b)):
+        a, b = ings_a.get(name), ings_b.get(name)
+        if a is None:
+            ingredients.append(("added", name, None, b))
+        elif b is None:
+            ingredients.append(("removed", name, a, None))
+        elif any(a.get(k) != b.get(k) for k in ("amount", "unit", "note")):
+            ingredients.append(("changed", name, a, b))
+    return {"fields": fields, "ingredients": ingredients}
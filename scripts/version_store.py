@@ -0,0 +1,251 @@
+"""
+Storage encoding for recipe_version (deltas and compression), shared by
+app.py, migrations 013/014 and db_quality_check.py.
+
+A recipe_version row is either
+
+    a keyframe   delta_json IS NULL; every column holds the full snapshot
+    a delta      delta_json holds the changes to DELTA_FIELDS relative to
+                 the previous version of the same recipe; those columns
+                 are NULL
+
+Metadata and the short fields (title, tags, type, kitchen, changed_*) are
+stored in full on every row, so listings never need reconstruction.
+
+delta_json is {field: change} for the DELTA_FIELDS that differ:
+
+    "text"                      the new value, stored as-is (or null)
+    [3, -1, ["ny rad\\n"], 12]   edit script over the old value's tokens:
+                                int > 0 copy n tokens, int < 0 skip n,
+                                list = insert these tokens
+
+Tokens are lines (keepends) for text fields and "...}" items for
+ingredients_json, so joining them reproduces the value byte for byte
+whatever JSON formatting the row was written with. The edit script is
+only used when it is shorter than the value itself.
+
+A writer starts a new keyframe once KEYFRAME_INTERVAL versions have passed
+since the last one, so materializing any version touches at most that many
+rows. Rows written in full by other tools (skill_remote_commit.py) are
+simply extra keyframes.
+
+Compression (migration 014): the large columns in COMPRESSED_FIELDS may
+hold a BLOB instead of TEXT — raw deflate against a preset dictionary
+from recipe_version_zdict, trained on this table (train_zdict) once it
+has ZDICT_MIN_ROWS rows and again each time it grows ZDICT_RETRAIN_GROWTH
+times over (zdict_due); until then values stay TEXT. A BLOB is
+
+    b"\x01" + dictionary id (2 bytes, big-endian) + deflate stream
+
+and is only written when it is shorter than the UTF-8 text. TEXT values
+are read as-is, so rows from tools that don't compress stay valid.
+materialize() decompresses the rows it reads; listings that only select
+metadata columns never touch the compressed ones.
+"""
+from __future__ import annotations
+
+import json
+import re
+import zlib
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+DELTA_FIELDS = ("description", "instructions", "notes", "ingredients_json")
+SNAPSHOT_FIELDS = ("title", "description", "instructions", "notes", "tags",
+                   "type", "kitchen", "ingredients_json")
+KEYFRAME_INTERVAL = 10
+COMPRESSED_FIELDS = ("instructions", "notes", "ingredients_json", "delta_json")
+ZDICT_SIZE = 32 * 1024  # deflate's window; a longer dictionary is ignored
+# No dictionary is trained before recipe_version has ZDICT_MIN_ROWS rows —
+# on fewer, too few fragments recur across recipes to be worth it — and a
+# new one is trained once the table has grown to ZDICT_RETRAIN_GROWTH times
+# the rows the newest dictionary was trained on. A dictionary shorter than
+# ZDICT_MIN_BYTES is never compressed against.
+ZDICT_MIN_ROWS = 200
+ZDICT_RETRAIN_GROWTH = 2
+ZDICT_MIN_BYTES = 256
+
+_ITEM_END = re.compile(r"(?<=\})")
+_ZFORMAT = b"\x01"
+_FRAGMENT_END = re.compile(r"(?<=\n)|(?<=, )")
+
+
+def _tokens(field: str, value: str) -> list[str]:
+    if field == "ingredients_json":
+        return [t for t in _ITEM_END.split(value) if t]
+    return value.splitlines(keepends=True)
+
+
+def _edit_script(field: str, old: str, new: str) -> list:
+    a, b = _tokens(field, old), _tokens(field, new)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b,
+                                               autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(b[j1:j2])
+    return ops
+
+
+def _apply_script(field: str, old: str, ops: list) -> str:
+    tokens = _tokens(field, old)
+    out, pos = [], 0
+    for op in ops:
+        if isinstance(op, list):
+            out.extend(op)
+        elif op > 0:
+            out.extend(tokens[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def encode_delta(prev: dict, new: dict) -> str:
+    """delta_json turning prev's DELTA_FIELDS into new's."""
+    delta = {}
+    for f in DELTA_FIELDS:
+        old, value = prev.get(f), new.get(f)
+        if old == value:
+            continue
+        change = value
+        if old and value:
+            ops = _edit_script(f, old, value)
+            if len(json.dumps(ops, ensure_ascii=False)) < len(
+                    json.dumps(value, ensure_ascii=False)):
+                change = ops
+        delta[f] = change
+    return json.dumps(delta, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(prev: dict, delta_json: str) -> dict:
+    """DELTA_FIELDS of the version that delta_json was encoded against
+    prev for."""
+    delta = json.loads(delta_json)
+    out = {}
+    for f in DELTA_FIELDS:
+        if f not in delta:
+            out[f] = prev.get(f)
+        elif isinstance(delta[f], list):
+            out[f] = _apply_script(f, prev.get(f) or "", delta[f])
+        else:
+            out[f] = delta[f]
+    return out
+
+
+def compress(value: str | None, zdict_id: int, zdict: bytes) -> str | bytes | None:
+    """value as a compressed BLOB, or unchanged if that isn't shorter."""
+    if not value:
+        return value
+    raw = value.encode("utf-8")
+    z = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=zdict)
+    blob = _ZFORMAT + zdict_id.to_bytes(2, "big") + z.compress(raw) + z.flush()
+    return blob if len(blob) < len(raw) else value
+
+
+def decompress(value, zdicts: dict[int, bytes]):
+    """TEXT/NULL pass through; a compressed BLOB comes back as str. Raises
+    ValueError for an unknown format or dictionary."""
+    if not isinstance(value, bytes):
+        return value
+    zdict = zdicts.get(int.from_bytes(value[1:3], "big"))
+    if value[:1] != _ZFORMAT or zdict is None:
+        raise ValueError("unreadable compressed recipe_version value")
+    z = zlib.decompressobj(-15, zdict=zdict)
+    return (z.decompress(value[3:]) + z.flush()).decode("utf-8")
+
+
+def current_zdict_id(zdicts: dict[int, bytes]) -> int | None:
+    """Id of the newest dictionary worth compressing with, or None."""
+    usable = [i for i, z in zdicts.items() if len(z) >= ZDICT_MIN_BYTES]
+    return max(usable) if usable else None
+
+
+def zdict_due(row_count: int, trained_rows: int | None) -> bool:
+    """Whether recipe_version, at row_count rows, is due a new dictionary.
+    trained_rows is the row count the newest usable dictionary was trained
+    at (None: there is none)."""
+    if row_count < ZDICT_MIN_ROWS:
+        return False
+    return trained_rows is None or row_count >= ZDICT_RETRAIN_GROWTH * trained_rows
+
+
+def compress_columns(stored: dict, zdict_id: int | None,
+                     zdict: bytes | None) -> dict:
+    """stored (column -> value) with COMPRESSED_FIELDS compressed; as-is
+    when there is no dictionary yet."""
+    if zdict is None:
+        return stored
+    return {c: compress(v, zdict_id, zdict) if c in COMPRESSED_FIELDS else v
+            for c, v in stored.items()}
+
+
+def train_zdict(samples, size: int = ZDICT_SIZE) -> bytes:
+    """A preset dictionary from (recipe_id, text) samples. Text is cut
+    into lines and JSON fragments (", "-separated: '"unit": "dl"',
+    '"note": null}'); fragments score by length × the number of distinct
+    recipes they occur in, so the JSON keys, common phrases and catalog
+    names win over text repeated across one heavily edited recipe's
+    versions. The best-scoring fragments go last, where deflate reaches
+    them with the shortest distances."""
+    seen_in = defaultdict(set)
+    for recipe_id, value in samples:
+        for frag in _FRAGMENT_END.split(value or ""):
+            if 3 <= len(frag) <= 400:
+                seen_in[frag].add(recipe_id)
+    scores = Counter({f: len(f.encode("utf-8")) * len(r)
+                      for f, r in seen_in.items() if len(r) > 1})
+    picked, used = [], 0
+    for frag, _ in scores.most_common():
+        n = len(frag.encode("utf-8"))
+        if used + n > size:
+            continue
+        picked.append(frag)
+        used += n
+    return "".join(reversed(picked)).encode("utf-8")
+
+
+def materialize(rows, wanted=None, zdicts=None) -> dict[int, dict]:
+    """Full rows for the versions in wanted (all, if None), from rows of one
+    recipe in version_number order starting at a keyframe. Returns
+    {version_number: dict(row) with DELTA_FIELDS filled in and
+    COMPRESSED_FIELDS decompressed with zdicts ({id: dictionary})}.
+    Raises ValueError if the first row is a delta (the chain has no
+    keyframe) or a value can't be decompressed."""
+    out, state = {}, None
+    for row in rows:
+        row = dict(row)
+        for f in COMPRESSED_FIELDS:
+            if isinstance(row.get(f), bytes):
+                row[f] = decompress(row[f], zdicts or {})
+        if row.get("delta_json") is None:
+            state = {f: row[f] for f in DELTA_FIELDS}
+        elif state is None:
+            raise ValueError(
+                f"recipe {row['recipe_id']} v{row['version_number']}: "
+                "delta without a keyframe before it"
+            )
+        else:
+            state = apply_delta(state, row["delta_json"])
+        if wanted is None or row["version_number"] in wanted:
+            row.update(state)
+            row["delta_json"] = None
+            out[row["version_number"]] = row
+    return out
+
+
+def storage_columns(prev: dict | None, snapshot: dict, since_keyframe: int,
+                    interval: int = KEYFRAME_INTERVAL) -> dict:
+    """Column values (DELTA_FIELDS + delta_json) for writing snapshot as the
+    version after prev. prev is the previous version materialized (None for
+    a recipe's first version); since_keyframe counts the versions from the
+    last keyframe up to and including prev."""
+    if prev is None or since_keyframe >= interval:
+        return {**{f: snapshot.get(f) for f in DELTA_FIELDS},
+                "delta_json": None}
+    return {**{f: None for f in DELTA_FIELDS},
+            "delta_json": encode_delta(prev, snapshot)}